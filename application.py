@@ -11,7 +11,8 @@ import warnings
 
 warnings.filterwarnings("ignore")
 
-from multiprocessing import Process, Pipe, Queue
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
 from threading import Thread
 
 import tkinter as tk
@@ -21,21 +22,40 @@ from tkinter.colorchooser import askcolor
 from settings import *
 from settings import Settings
 
-from simulation_wrapper import run_simulation
+from simulation_wrapper import serve
+from runner import COLUMNS, table_row, RESULTS, PROGRESS, END, RUN, CANCEL, QUIT
 
 #--------- Do analizy  -----------------------------
 import matplotlib.ticker as ticker
 from   matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from   matplotlib import figure
-from   matplotlib import pyplot as plt
 from   matplotlib import gridspec
+from   matplotlib import style
+from   matplotlib.axes import Axes
 import matplotlib.image as pltimage
-plt.style.use("ggplot")
+style.use("ggplot")
 
-import seaborn     as sbn
-import pandas      as pd
-import numpy       as np
-import scipy.stats as sci
+# seaborn, pandas, numpy i scipy.stats są ładowane dopiero przy pierwszej
+# analizie (load_analysis_modules), żeby nie opóźniać pokazania okna
+sbn = None
+pd  = None
+np  = None
+sci = None
+
+
+
+def load_analysis_modules() -> None:
+    '''
+    Imports modules used for data analysis on their first use
+    '''
+
+    global sbn, pd, np, sci
+
+    if pd is None:
+        import seaborn     as sbn
+        import pandas      as pd
+        import numpy       as np
+        import scipy.stats as sci
 
 #------------------------------------------------
 
@@ -92,11 +112,15 @@ class appGUI:
 
     def __init__(self) -> None:
         self.settings = Settings.load_from_file('settings.json')
+        # proces symulacji żyje przez całą sesję, serie są do niego wysyłane przez Pipe
         self.process: Process = None
+        self.pipe: Pipe = None
         self.thread: Thread = None
+        self.cancelled: bool = False
+        # czas startu ostatniej serii, pokazywane są tylko zrzuty zapisane później
+        self.batch_start: float = None
+
 
-    
-        self.data_collected: list = None 
 
         self.simulation_ends_sucesfuly: bool = False
         self.simulation_running: bool = False
@@ -112,7 +136,9 @@ class appGUI:
 
         self.pd_series = []
         self.cykle_series = []    
-        self.dataframe_all= pd.DataFrame()                                
+        self.dataframe_all= None
+        # wiersze bieżącej serii, DataFrame powstaje z nich na końcu serii
+        self.rows: list = []
 
 
 
@@ -417,12 +443,12 @@ class appGUI:
 #                                           ANALIZA DANYCH
 #----------------------------------------------------------------------------------------------------------------
 
-    def two_subplots(self, x: bool) -> list[plt.Axes]:
+    def two_subplots(self, x: bool) -> list[Axes]:
 
         for axes in self.fig.axes:
             self.fig.delaxes(axes)
 
-        axes: plt.Axes
+        axes: Axes
         if x:
             spec = gridspec.GridSpec(ncols=2, nrows=1, width_ratios=[6,1], hspace=0.1)
             self.fig.add_subplot(spec[0])
@@ -437,36 +463,36 @@ class appGUI:
 
 
 
-    def analayze(self):
+    def analayze(self, batch: list):
         """
-        Extract data from Collector object to pandas DataFrame
+        Appends batch of runs received from the simulation process to the rows
+        of the current batch, DataFrame is built from them in finish_analysis()
         """
-        column_names = ["X", "Y","P1_PROB", "P2_PROB", "N", "PD", "Cykle", "Time", "S/s", "NS", "WE"]
-        converted_data = []
-
-        for i in range(len(self.data_collected)):
-            info, run, times = self.data_collected[i]
-
-            size = info[4] * info[5]
-            data = (
-                info[4],               #X
-                info[5],               #Y
-                info[1],               #P1_prob
-                info[2],               #P2_prob
-                info[3],               #N
-                run[3] * 100 / size,   #PD%
-                run[4],                #cykle
-                times[0],              #Time
-                #times[1],
-                times[2],              #Sim/s
-                run[5],                #NS
-                run[6]                 #WE
-            )
-            converted_data.append(data)
 
-        self.dataframe = pd.DataFrame(converted_data, columns=column_names)
+        for info, run, times in batch:
+            self.rows.append(table_row(info, run, times))
 
-        self.dataframe_all = pd.concat([self.dataframe_all, self.dataframe])
+
+
+    def finish_analysis(self):
+        """
+        Statistics of the whole batch, after the last result arrived
+        """
+
+        # DataFrame budowany raz z całej serii, typy kolumn jak w wierszach
+        self.dataframe = pd.DataFrame(self.rows, columns=COLUMNS)
+        self.rows = []
+
+        self.simulation_ends_sucesfuly = len(self.dataframe) > 0
+        if self.dataframe_all is None:
+            self.dataframe_all = self.dataframe
+        else:
+            self.dataframe_all = pd.concat([self.dataframe_all, self.dataframe])
+
+        if self.dry_run.get() and self.pdf.get():
+            self.fit_test()
+
+        self.statisticks()
 
 
 
@@ -745,8 +771,17 @@ class appGUI:
             Domyślnie = True
         '''
 
-        list_of_files = glob.glob('*.png')
-        latest_file   = max(list_of_files, key=os.path.getctime)
+        #zrzuty zapisywane są jako png albo bmp (SCREENSHOT_FORMAT), tylko te z bieżącej serii;
+        #przy SCREENSHOT_EVERY = 0 albo przed pierwszą serią może nie być żadnego
+        if self.batch_start is None:
+            return
+
+        list_of_files = [name for name in glob.glob('simulation_result_*.png') + glob.glob('simulation_result_*.' + SCREENSHOT_BMP)
+                         if os.path.getmtime(name) >= self.batch_start]
+        if not list_of_files:
+            return
+
+        latest_file   = max(list_of_files, key=os.path.getmtime)
         img           = pltimage.imread(latest_file)
 
         a = self.two_subplots(False)[0]
@@ -898,65 +933,79 @@ class appGUI:
 #--------------------------------------------------------------------------------------------
 #                                    MULIPROCESSING
 #--------------------------------------------------------------------------------------------
-    def thread_worker(self, pipe: Pipe, process:Process, queue:Queue):
+    def show_progress(self, d: tuple):
+        """
+        Updates progressbar and labels with (run, ITERATIONS, percent, fps, eta)
+        """
+
+        self.progressbar.set(d[2])
+        progress = f'{d[2]} % [{d[0]}/{d[1]} ({d[3]:.2f} [Symulacji/s])]'
+        eta = math.floor(d[4])
+        self.progress_label.set(progress)
+        self.eta_label.set('ETA: ' + str(datetime.timedelta(seconds=eta)))
+
+
+
+    def thread_worker(self, pipe: Pipe, process:Process):
         """
-        Wątek sprawdza cyklicznie czy symulacja się zakończyła ( czy istnieje process
-        który ją prowadzi), aktualizuję progressbar, sprawdza czy 
-        proces wysłął dane. Wątek jest konieczny aby nie blokować GUI"""
+        Wątek czeka (bez aktywnego odpytywania) na wiadomości z Pipe albo
+        na zakończenie procesu, który prowadzi symulację, aktualizuję progressbar
+        i dopisuje przysłane dane. Wątek jest konieczny aby nie blokować GUI"""
 
-        #zmienna która odbiera stan symulacji
-        d: tuple
         run_thread = True
 
         labstart = f'0 % [0 / {self.iteration_limit.get()}]'
         self.progress_label.set(labstart)
         self.best_fitting_pdf_iter = []
         self.best_fitting_pdf_pd = []
+        # moduły analizy ładują się w tym wątku, równolegle z symulacją
+        load_analysis_modules()
+        # wyniki dopisywane na bieżąco, w miarę jak przychodzą
+        self.rows = []
+        self.dataframe = pd.DataFrame(columns=COLUMNS)
 
         try:
-            self.simulation_running = True
             self.interface_lock(True)
-            while process and process.is_alive() or run_thread:
-                try:
-                   d = queue.get(block = False)
-                except:
-                    pass
-                else:
-                    self.progressbar.set(d[2])
-                    progress = f'{d[2]} % [{d[0]}/{d[1]} ({d[3]:.2f} [Symulacji/s])]'
-                    eta = math.floor(d[4])
-                    self.progress_label.set(progress)
-                    self.eta_label.set('ETA: ' + str(datetime.timedelta(seconds=eta)))
+            while run_thread:
+                # czekaj na dane w Pipe albo na koniec procesu, timeout tylko na wszelki wypadek
+                ready = wait([pipe, process.sentinel], timeout=1.0)
 
-                if pipe.poll():
+                # odbierz wszystko co czeka, z postępów pokazywany jest tylko ostatni
+                d = None
+                while run_thread and pipe.poll():
                     # print("PROCESS SENT DATA")
-                    self.data_collected: list = pipe.recv()
-                    if len(self.data_collected) > 0:
-                        self.simulation_ends_sucesfuly = True
-                    else:
-                        self.simulation_ends_sucesfuly = False
-                    
-                    # print("PROCESS ENDED")
-
-                    self.analayze()
-                    if self.dry_run.get() and self.pdf.get():
-                        self.fit_test()
-                    #     self.unlock_plot_buttons(True)
-                    # else:
-                    #     self.unlock_plot_buttons(False)
-
-                    self.statisticks()
-                    # zakończ wątek
-
-                    run_thread = False
-            else:
-                # print("PROCESS TERMINATED BY USER")
-                self.simulation_ends_sucesfuly = False
+                    tag, message = pipe.recv()
+                    if tag == PROGRESS:
+                        d = message
+
+                    elif tag == RESULTS:
+                        self.analayze(message)
+
+                    elif tag == END:
+                        # print("PROCESS ENDED")
+                        self.finish_analysis()
+                        if self.cancelled:
+                            self.simulation_ends_sucesfuly = False
+                        # zakończ wątek
+                        run_thread = False
+
+                if d:
+                    self.show_progress(d)
+
+                if run_thread and process.sentinel in ready and not pipe.poll():
+                    # print("PROCESS TERMINATED BY USER")
+                    raise EOFError
         except EOFError:
              print("EOF")
+             # proces przerwany: zostają wyniki, które zdążył przysłać
+             if len(self.rows) > 0:
+                 self.finish_analysis()
+             self.simulation_ends_sucesfuly = False
+             # proces symulacji zostanie uruchomiony ponownie przy następnym starcie
+             pipe.close()
+             self.process = None
             
         finally:
-            pipe.close()
             self.simulation_running = False
             self.interface_lock(False)
             self.progressbar.set(100)
@@ -968,30 +1017,55 @@ class appGUI:
         """
         proces uruchamia symulacje, a wątek sprawdza cyklicznie czy symulacja sie skończyła, 
         sprawdzanie jest w œatku
-        bo inaczej zablokowałbym całe gui czekając na Pipe.recv()
+        bo inaczej zablokowałbym całe gui czekając na Pipe.recv().
+        Proces (razem z pulą procesów roboczych) jest tworzony tylko przy pierwszym
+        starcie, kolejne serie są do niego wysyłane jako polecenie RUN
         """
         
         self.update_settings()
         self.simulation_ends_sucesfuly = False
-            
-        parent_conn, child_conn = Pipe()
-        queue = Queue()
-        self.process = Process(target=run_simulation, args=(self.settings, child_conn, queue))
-        self.thread  = Thread (target=self.thread_worker, args=(parent_conn, self.process, queue))
-
-        self.process.start()
-        child_conn.close()
+        self.cancelled = False
+        self.batch_start = time.time()
+
+        if self.process is None or not self.process.is_alive():
+            self.pipe, child_conn = Pipe()
+            self.process = Process(target=serve, args=(child_conn,))
+            self.process.start()
+            child_conn.close()
+
+        self.pipe.send((RUN, self.settings))
+        # ustawiane przed startem wątku, który ładuje moduły analizy przez
+        # kilka sekund, żeby STOP w tym czasie też wysłał CANCEL
+        self.simulation_running = True
+        self.thread  = Thread (target=self.thread_worker, args=(self.pipe, self.process))
         self.thread.start()
 
 
 
     def on_process_end(self):
         '''
-        Kończy process jeżeli wciąż istnieje
+        Przerywa bieżącą serię, proces symulacji zostaje do następnego startu
+        '''
+
+        if self.simulation_running and self.process and self.process.is_alive():
+            self.cancelled = True
+            self.pipe.send((CANCEL, None))
+
+
+
+    def shutdown_process(self):
+        '''
+        Kończy proces symulacji, jeżeli sam nie skończy się w ciągu sekundy
+        jest zabijany
         '''
 
         if self.process and self.process.is_alive():
-            self.process.terminate()
+            self.on_process_end()
+            self.pipe.send((QUIT, None))
+            self.process.join(timeout=1)
+
+            if self.process.is_alive():
+                self.process.terminate()
 
 
 #------------------------------------ MULTIPROCESSNG END --------------------------------------------
@@ -1128,7 +1202,7 @@ class appGUI:
         Actions that have to be taken before 
         we can close progrram
         """
-        self.on_process_end()
+        self.shutdown_process()
         self.update_settings()
         self.settings.save_to_file('settings.json')
         self.window.destroy()
@@ -0,0 +1,150 @@
+"""
+Headless batch runner. Runs dryrun simulations (or a parameter sweep)
+on a worker pool and writes results to a csv file, without GUI,
+pygame nor plotting libraries.
+
+    python cli.py settings.json --set P1_PROBABILITY=0.002 --set GRID_SIZE=[100,100] \\
+                  --iterations 1000 --workers 16 --output results.csv
+
+    python cli.py settings.json --sweep sweep.json --output sweep.csv
+"""
+
+import time
+IMPORT_START = time.perf_counter()
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+from settings import *
+from settings import Settings
+
+import runner
+import sweep
+
+# czas importu modułów programu, wypisywany razem z wynikami
+IMPORT_TIME = time.perf_counter() - IMPORT_START
+
+
+
+def parse_override(text: str) -> tuple[str, object]:
+    '''
+    Parses KEY=VALUE, value is read as JSON when possible, otherwise as text
+    '''
+
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f'expected KEY=VALUE, got {text}')
+
+    try:
+        return key.strip(), json.loads(value)
+    except json.JSONDecodeError:
+        return key.strip(), value
+
+
+
+def load_settings(name: str, overrides: list[tuple[str, object]]) -> Settings:
+    '''
+    Settings from file (or defaults when file is missing) with overrides applied
+
+    Raises:
+    ------
+    KeyError
+        if override names unknown setting
+    '''
+
+    if os.path.exists(name):
+        with open(name, 'r') as f:
+            d: dict = json.load(f)
+    else:
+        d = Settings.from_defaults(make_settings_file=False).to_dict()
+
+    known = Settings.from_defaults(make_settings_file=False).to_dict()
+    for key, value in overrides:
+        if key not in known:
+            raise KeyError(key)
+        d[key] = value
+
+    return Settings.from_dict(d)
+
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Headless batch of dryrun simulations')
+
+    parser.add_argument('settings', nargs='?', default='settings.json',
+                        help='settings file (defaults are used when it does not exist)')
+    parser.add_argument('--set', dest='overrides', action='append', default=[], type=parse_override,
+                        metavar='KEY=VALUE', help='override a setting, value in JSON (repeatable)')
+    parser.add_argument('--iterations', type=int, help='number of runs (ITERATIONS)')
+    parser.add_argument('--workers', type=int, help='worker processes, 0 = all cores (WORKERS)')
+    parser.add_argument('--sweep', metavar='FILE', help='JSON file with a parameter sweep')
+    parser.add_argument('--output', '-o', default='results.csv', help='csv file for results')
+
+    return parser
+
+
+
+def run_batch(settings: Settings, output: str) -> int:
+    '''
+    Runs ITERATIONS dryruns, rows are written to output as soon as they come
+
+    Returns:
+    -------
+    int
+        number of finished runs
+    '''
+
+    done = 0
+    with open(output, 'w') as f:
+        f.write(';'.join(runner.COLUMNS) + '\n')
+
+        for info, result, cykle_time in runner.pool_runs(settings):
+            row = runner.table_row(info, result, (cykle_time, 0, 1 / cykle_time))
+            f.write(';'.join(str(value) for value in row) + '\n')
+            done += 1
+
+    return done
+
+
+
+def main(argv: list[str] = None) -> int:
+    parser = make_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        settings = load_settings(args.settings, args.overrides)
+    except KeyError as e:
+        parser.error(f'unknown setting {e}')
+
+    settings.DRYRUN = 1
+    if args.iterations is not None:
+        settings.ITERATIONS = args.iterations
+    if args.workers is not None:
+        settings.WORKERS = args.workers
+
+    start = time.time()
+    if args.sweep:
+        # punkty przeglądu liczone są pojedynczymi symulacjami
+        if settings.ENGINE == ENGINE_ENSEMBLE:
+            print('warning: --sweep does not use Ensemble2D batches, ENGINE=ensemble runs one replica at a time',
+                  file=sys.stderr)
+        table = sweep.run_sweep(settings, sweep.load_spec(args.sweep))
+        sweep.save_table(table, args.output)
+        done = sum(len(rows) for rows in table.values())
+    else:
+        done = run_batch(settings, args.output)
+
+    elapsed = time.time() - start
+    print(f'{done} runs in {elapsed:.2f} s, {done / elapsed:.2f} runs/s, '
+          f'{runner.workers_count(settings)} workers, import {IMPORT_TIME * 1000:.0f} ms -> {args.output}')
+
+    return 0
+
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
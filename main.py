@@ -1,4 +1,3 @@
-from application import appGUI
 import multiprocessing
 import settings
 import os
@@ -21,6 +20,10 @@ if __name__ == "__main__":
     else:
         print("Nieznaleziono settings.json: Generowanie pliku domyślengo")
         settings.Settings.from_defaults()
+    #GUI importowane dopiero tutaj, procesy potomne (spawn) ponownie importują
+    #ten moduł i nie powinny ładować interfejsu ani bibliotek do analizy
+    from application import appGUI
+
     #punkt wejścia do całęgo programu:
     app = appGUI()
     app.run()
\ No newline at end of file
@@ -0,0 +1,571 @@
+"""
+Dryrun execution without visualisation. Module imports only the simulation
+itself, so worker processes of the pool do not load pygame nor the GUI.
+"""
+
+import bisect
+import math
+import os
+import signal
+import statistics
+import time
+from   multiprocessing import Pipe, Pool, Value, TimeoutError
+from   typing import Callable, Iterator
+from   settings import *
+from   settings import Settings
+import symulacja
+
+from symulacja import Symulacja2D as Sim2D
+
+
+
+def run_without_visualisation(settings: Settings):
+    running = True
+    world = symulacja.make_simulation(settings)
+
+    cykles_limited : bool = True if settings.SIMULATION_CYKLES > 0 else False
+    cykles = settings.SIMULATION_CYKLES
+
+    while running:
+        world.next_step()
+
+        state = world.simulation_state()
+        if state == symulacja.PATH_FOUND:
+            running = False
+
+        elif cykles_limited == True:
+            if world.cykles >= cykles:
+                running = False
+
+    
+    paths = world.paths_direction
+    if not paths:
+        paths = (None, None)
+
+    return (world.P1, world.P2, world.D, world.PD, world.cykles, paths[Sim2D.NS], paths[Sim2D.WE])              
+
+
+
+def simulation_info(run: int, s: Settings) -> tuple:
+    return (
+        run,
+        s.P1_PROBABILITY,
+        s.P2_PROBABILITY,
+        s.HEAL_CYKLES,
+        s.GRID_SIZE[0],
+        s.GRID_SIZE[1],
+        s.SIMULATION_CYKLES
+    )
+
+
+
+# znaczniki wiadomości wysyłanych przez Pipe: (RESULTS, lista uruchomień),
+# (PROGRESS, (run, ITERATIONS, percent, fps, eta)) i (END, None)
+RESULTS  = "results"
+PROGRESS = "progress"
+END      = "end"
+
+# polecenia dla procesu symulacji (simulation_wrapper.serve): (RUN, settings),
+# (CANCEL, None) przerywa bieżącą serię, (QUIT, None) kończy proces
+RUN    = "run"
+CANCEL = "cancel"
+QUIT   = "quit"
+
+# największa paczka uruchomień wysyłana do procesu puli, wyniki paczki
+# docierają dopiero po jej skończeniu, więc większe opóźniają strumień
+MAX_CHUNK = 4
+
+# kolumny tabeli wyników, jak w appGUI.analayze()
+COLUMNS = ["X", "Y","P1_PROB", "P2_PROB", "N", "PD", "Cykle", "Time", "S/s", "NS", "WE"]
+
+
+
+def table_row(info: tuple, run: tuple, times: tuple) -> tuple:
+    '''
+    Converts one entry of collected data (simulation_info, result, times)
+    to a row of COLUMNS
+    '''
+
+    size = info[4] * info[5]
+    return (
+        info[4],               #X
+        info[5],               #Y
+        info[1],               #P1_prob
+        info[2],               #P2_prob
+        info[3],               #N
+        run[3] * 100 / size,   #PD%
+        run[4],                #cykle
+        times[0],              #Time
+        #times[1],
+        times[2],              #Sim/s
+        run[5],                #NS
+        run[6]                 #WE
+    )
+
+
+
+class RunningStats:
+    '''
+    Online mean and variance (Welford) of a series of values. When quantile
+    is given, values are also kept sorted for order statistics
+    '''
+
+    def __init__(self, quantile: float = 0.0) -> None:
+        self.count: int = 0
+        self.mean: float = 0.0
+        self._m2: float = 0.0
+        self._quantile: float = quantile
+        self._sorted: list[float] = []
+
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if self._quantile:
+            bisect.insort(self._sorted, value)
+
+
+    def relative_width(self, z: float) -> float:
+        '''
+        Width of the confidence interval of the mean (or the quantile)
+        divided by the estimate, z is the normal distribution quantile
+        of the confidence level
+        '''
+
+        n = self.count
+        if n < 2:
+            return math.inf
+
+        if not self._quantile:
+            width = 2 * z * math.sqrt(self.variance / n)
+            estimate = self.mean
+
+        else:
+            # przedział z rozkładu rang (przybliżenie normalne rozkładu dwumianowego)
+            q = self._quantile
+            spread = z * math.sqrt(n * q * (1 - q))
+            lower = self._sorted[max(0, math.floor(n * q - spread))]
+            upper = self._sorted[min(n - 1, math.ceil(n * q + spread))]
+            width = upper - lower
+            estimate = self._sorted[min(n - 1, int(n * q))]
+
+        if estimate == 0:
+            return 0.0 if width == 0 else math.inf
+
+        return width / abs(estimate)
+
+
+
+class StoppingRule:
+    '''
+    Sequential stopping: runs go on until confidence intervals of Cykle
+    and PD are narrower than TARGET_PRECISION of their estimates, but
+    there are at least MIN_ITERATIONS and at most ITERATIONS runs
+    '''
+
+    def __init__(self, settings: Settings) -> None:
+        s = settings
+        self._precision: float = s.TARGET_PRECISION
+        self._min_runs: int = s.MIN_ITERATIONS
+        self._z: float = statistics.NormalDist().inv_cdf((1 + s.CONFIDENCE) / 2)
+        self._cykles = RunningStats(s.TARGET_QUANTILE)
+        self._pd = RunningStats(s.TARGET_QUANTILE)
+
+
+    @property
+    def enabled(self) -> bool:
+        return self._precision > 0
+
+
+    def add(self, result: tuple) -> bool:
+        '''
+        Adds result of a run
+
+        Returns:
+        -------
+        bool
+            True if no more runs are needed
+        '''
+
+        if not self.enabled:
+            return False
+
+        self._cykles.add(result[4])
+        self._pd.add(result[3])
+
+        if self._cykles.count < self._min_runs:
+            return False
+
+        return self._cykles.relative_width(self._z) <= self._precision and \
+               self._pd.relative_width(self._z) <= self._precision
+
+
+
+class ResultStream:
+    '''
+    Sends results of runs and progress over the pipe. Results go in small
+    batches, when batch_size runs are collected or interval seconds have
+    passed since the last message. Of progress updates in between only
+    the latest one is sent, so GUI gets at most a few messages per second.
+    Process keeps only the current batch in memory
+    '''
+
+    def __init__(self, pipe: Pipe, batch_size: int = 256, interval: float = 0.25) -> None:
+        self._pipe = pipe
+        self._batch: list = []
+        self._progress: tuple = None
+        self._batch_size: int = batch_size
+        self._interval: float = interval
+        self._sent: float = time.time()
+        self._cancelled: bool = False
+
+
+    def add(self, run_info: list) -> None:
+        self._batch.append(run_info)
+
+        if len(self._batch) >= self._batch_size or time.time() - self._sent >= self._interval:
+            self.flush()
+
+
+    def progress(self, info: tuple) -> None:
+        '''
+        Progress (run, ITERATIONS, percent, fps, eta), sent with the next batch
+        '''
+
+        self._progress = info
+
+        if time.time() - self._sent >= self._interval:
+            self.flush()
+
+
+    def flush(self) -> None:
+        if self._batch:
+            self._pipe.send((RESULTS, self._batch))
+            self._batch = []
+
+        if self._progress:
+            self._pipe.send((PROGRESS, self._progress))
+            self._progress = None
+
+        self._sent = time.time()
+
+
+    def cancelled(self) -> bool:
+        '''
+        Checks (without waiting) if CANCEL command came over the pipe
+        '''
+
+        try:
+            while not self._cancelled and self._pipe.poll():
+                command, _ = self._pipe.recv()
+                self._cancelled = command == CANCEL
+        except EOFError:
+            # GUI zamknęło swój koniec Pipe
+            self._cancelled = True
+
+        return self._cancelled
+
+
+    def close(self) -> None:
+        '''
+        Sends the rest of results and END message. Pipe stays open,
+        it belongs to the process serving the GUI
+        '''
+
+        self.flush()
+        self._pipe.send((END, None))
+
+
+
+def workers_count(settings: Settings) -> int:
+    '''
+    Number of worker processes, WORKERS = 0 means all cores
+    '''
+
+    return settings.WORKERS if settings.WORKERS > 0 else (os.cpu_count() or 1)
+
+
+
+# numer serii, ustawiany w procesach WarmPool przez _init_worker
+_generation: Value = None
+
+
+
+def _init_worker(generation: Value) -> None:
+    global _generation
+    _generation = generation
+
+    # procesy puli nie dziedziczą obsługi SIGTERM procesu serve
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+
+class WarmPool:
+    '''
+    Pool of worker processes kept alive between batches, so repeated
+    batches do not pay for starting processes and importing modules.
+    Jobs carry number of their batch, after cancel() workers skip
+    jobs of the cancelled batch that are still queued
+    '''
+
+    def __init__(self) -> None:
+        self._pool: Pool = None
+        self._workers: int = 0
+        self._generation: Value = Value('i', 0)
+
+
+    @property
+    def generation(self) -> int:
+        return self._generation.value
+
+
+    def get(self, workers: int) -> Pool:
+        '''
+        Returns pool of given size, pool is created again only when size changes
+        '''
+
+        if self._pool is None or self._workers != workers:
+            self.close()
+            self._pool = Pool(workers, initializer=_init_worker, initargs=(self._generation,))
+            self._workers = workers
+
+        return self._pool
+
+
+    def cancel(self) -> None:
+        with self._generation.get_lock():
+            self._generation.value += 1
+
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+
+def dry_run(job: tuple) -> tuple[tuple, tuple, float]:
+    '''
+    Single dryrun executed by a worker of the pool, job is (settings, run)
+    or (settings, run, batch number) for WarmPool
+
+    Returns:
+    -------
+    tuple
+        (simulation_info, result, time of the run), None for a job
+        of a cancelled batch
+    '''
+
+    settings, run = job[0], job[1]
+    if len(job) > 2 and job[2] != _generation.value:
+        return None
+
+    start = time.time()
+    result = run_without_visualisation(settings)
+
+    return simulation_info(run, settings), result, time.time() - start
+
+
+
+def dry_run_chunk(jobs: list[tuple]) -> list[tuple[tuple, tuple, float]]:
+    return [dry_run(job) for job in jobs]
+
+
+
+def ensemble_batch(job: tuple) -> list[tuple[tuple, tuple, float]]:
+    '''
+    Runs (settings, first run, replicas) with one Ensemble2D, executed
+    by a worker of the pool, or (settings, first run, replicas, batch
+    number) for WarmPool
+
+    Returns:
+    -------
+    list
+        (simulation_info, result, time per run) of every replica, empty
+        for a job of a cancelled batch
+    '''
+
+    # numpy ładowany tylko dla silnika "ensemble"
+    from symulacja_numpy import Ensemble2D
+
+    settings, first, replicas = job[:3]
+    if len(job) > 3 and job[3] != _generation.value:
+        return []
+
+    start = time.time()
+    results = Ensemble2D(settings, replicas).run()
+    cykle_time = (time.time() - start) / replicas
+
+    return [(simulation_info(first + i, settings), result, cykle_time) for i, result in enumerate(results)]
+
+
+
+def warm_imap(warm: WarmPool, workers: int, function: Callable, jobs: Iterator,
+              cancelled: Callable[[], bool] = None) -> Iterator:
+    '''
+    Results of function over jobs on the warm pool, in order of jobs.
+    While waiting, cancelled() is checked a few times per second. When
+    iteration ends, the rest of jobs of this batch is skipped by workers
+    '''
+
+    # tylko iterator imap z pojedynczymi zadaniami pozwala czekać na wynik
+    # z limitem czasu, stąd paczki uruchomień tworzone przez wywołującego
+    results = warm.get(workers).imap(function, jobs)
+    try:
+        while True:
+            try:
+                yield results.next(timeout=0.25)
+            except TimeoutError:
+                if cancelled and cancelled():
+                    return
+            except StopIteration:
+                return
+    finally:
+        # procesy zostają, pomijają tylko resztę zadań tej serii
+        warm.cancel()
+
+
+
+def ensemble_runs(settings: Settings, warm: WarmPool = None,
+                  cancelled: Callable[[], bool] = None) -> Iterator[tuple[tuple, tuple, float]]:
+    """
+    Runs ITERATIONS dryruns with the "ensemble" engine and yields
+    (simulation_info, result, time) in run order. Runs are split into
+    Ensemble2D batches of at most ENSEMBLE_SIZE replicas, small enough
+    that every worker of the pool gets a batch. Warm and cancelled
+    work as in pool_runs()
+    """
+
+    s = settings
+    stop = StoppingRule(s)
+    workers = min(workers_count(s), s.ITERATIONS)
+    size = max(1, min(s.ENSEMBLE_SIZE, math.ceil(s.ITERATIONS / max(workers, 1))))
+    jobs = [(settings, first, min(size, s.ITERATIONS - first)) for first in range(0, s.ITERATIONS, size)]
+    pool = None
+
+    if workers <= 1:
+        batches = map(ensemble_batch, jobs)
+    elif warm is not None:
+        generation = warm.generation
+        jobs = [job + (generation,) for job in jobs]
+        batches = warm_imap(warm, workers_count(s), ensemble_batch, jobs, cancelled)
+    else:
+        pool = Pool(workers)
+        batches = pool.imap(ensemble_batch, jobs)
+
+    try:
+        for batch in batches:
+            for info, result, cykle_time in batch:
+                yield info, result, cykle_time
+
+                if stop.add(result):
+                    return
+    finally:
+        if warm is not None and workers > 1:
+            batches.close()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+
+def pool_runs(settings: Settings, warm: WarmPool = None,
+              cancelled: Callable[[], bool] = None) -> Iterator[tuple[tuple, tuple, float]]:
+    """
+    Runs ITERATIONS dryruns on a pool of WORKERS processes (without pool
+    for one worker) and yields (simulation_info, result, time) in run order.
+    Stops early when the StoppingRule is satisfied. With warm given its
+    processes are used, otherwise pool lives only for this batch. While
+    waiting for results of a warm pool, cancelled() is checked a few
+    times per second
+    """
+
+    s = settings
+    if s.ENGINE == ENGINE_ENSEMBLE:
+        yield from ensemble_runs(settings, warm, cancelled)
+        return
+
+    stop = StoppingRule(s)
+    workers = min(workers_count(s), s.ITERATIONS)
+    jobs = ((settings, run) for run in range(s.ITERATIONS))
+
+    if workers <= 1:
+        for job in jobs:
+            info, result, cykle_time = dry_run(job)
+            yield info, result, cykle_time
+
+            if stop.add(result):
+                return
+        return
+
+    # kilka paczek na proces: mniej komunikacji, a obciążenie wciąż wyrównane,
+    # przy regule stopu pojedynczo, żeby nie liczyć zbędnych uruchomień
+    chunksize = 1 if stop.enabled else max(1, min(s.ITERATIONS // (workers * 8), MAX_CHUNK))
+
+    if warm is not None:
+        generation = warm.generation
+        chunks = ([(settings, run, generation) for run in range(first, min(first + chunksize, s.ITERATIONS))]
+                  for first in range(0, s.ITERATIONS, chunksize))
+
+        # pula ma zawsze WORKERS procesów, krótsza seria dostaje po prostu
+        # mniej zadań, więc zmiana ITERATIONS nie tworzy puli od nowa
+        results = warm_imap(warm, workers_count(s), dry_run_chunk, chunks, cancelled)
+        try:
+            for chunk in results:
+                for info, result, cykle_time in chunk:
+                    yield info, result, cykle_time
+
+                    if stop.add(result):
+                        return
+        finally:
+            results.close()
+        return
+
+    with Pool(workers) as pool:
+        # imap oddaje wyniki w kolejności uruchomień
+        for info, result, cykle_time in pool.imap(dry_run, jobs, chunksize):
+            yield info, result, cykle_time
+
+            # wyjście z bloku with kończy procesy liczące zbędne uruchomienia
+            if stop.add(result):
+                break
+
+
+
+def run_pool(settings: Settings, pipe: Pipe, warm: WarmPool = None):
+    """
+    Dryrun with ITERATIONS spread over a pool of WORKERS processes.
+    Results are streamed in run order and in the same format as by
+    simulation_wrapper.run_simulation()
+    """
+
+    s = settings
+    stream = ResultStream(pipe)
+    runs = pool_runs(settings, warm, stream.cancelled)
+
+    start = time.time()
+    for info, result, cykle_time in runs:
+        run = info[0]
+        done = run + 1
+
+        fps     = done / (time.time() - start)
+        eta     = (s.ITERATIONS - done) / fps
+        percent = math.floor(done*100 / s.ITERATIONS + .5)
+
+        stream.add([info, result, (cykle_time, eta, 1 / cykle_time)])
+        stream.progress((run, s.ITERATIONS, percent, fps, eta))
+
+        if stream.cancelled():
+            break
+
+    runs.close()
+    stream.close()
@@ -73,6 +73,32 @@ SIMULATION_CYKLES     = "SIMULATION_CYKLES"
 #TYPE                  = "TYPE"
 IMAGE_PATH            = "IMAGE_PATH"
 BACKGROUND_COLOR      = "BACKGROUND_COLOR"
+ENGINE                = "ENGINE"
+ENSEMBLE_SIZE         = "ENSEMBLE_SIZE"
+DRAW_MODE             = "DRAW_MODE"
+EVENT_DRIVEN          = "EVENT_DRIVEN"
+ACTIVE_FRONTIER       = "ACTIVE_FRONTIER"
+WORKERS               = "WORKERS"
+TARGET_PRECISION      = "TARGET_PRECISION"
+MIN_ITERATIONS        = "MIN_ITERATIONS"
+CONFIDENCE            = "CONFIDENCE"
+TARGET_QUANTILE       = "TARGET_QUANTILE"
+STEPS_PER_FRAME       = "STEPS_PER_FRAME"
+SCREENSHOT_FORMAT     = "SCREENSHOT_FORMAT"
+SCREENSHOT_EVERY      = "SCREENSHOT_EVERY"
+
+#Silniki symulacji (wartości ENGINE)
+ENGINE_PYTHON         = "python"
+ENGINE_NUMPY          = "numpy"
+ENGINE_ENSEMBLE       = "ensemble"
+
+#Sposoby losowania defektów (wartości DRAW_MODE)
+DRAW_BERNOULLI        = "bernoulli"
+DRAW_GEOMETRIC        = "geometric"
+
+#Formaty zrzutów ekranu wizualizacji (wartości SCREENSHOT_FORMAT)
+SCREENSHOT_PNG        = "png"
+SCREENSHOT_BMP        = "bmp"
 
 
 
@@ -146,6 +172,39 @@ class Settings:
     # Path to img file
     IMAGE_PATH: str
 
+    # Simulation engine used in dryrun mode: "python", "numpy" or "ensemble"
+    ENGINE: str = ENGINE_PYTHON
+    # How many replicas "ensemble" engine advances at once
+    ENSEMBLE_SIZE: int = 256
+    # How "python" engine draws defects: "bernoulli" (every cell) or
+    # "geometric" (skips between hits)
+    DRAW_MODE: str = DRAW_BERNOULLI
+    # "python" engine jumps over cycles in which nothing changes (0 = off)
+    EVENT_DRIVEN: int = 0
+    # "python" engine updates only cells near defects and P2 cells,
+    # defects are drawn with geometric skips (0 = off)
+    ACTIVE_FRONTIER: int = 0
+    # Number of worker processes for dryrun (0 = all cores, 1 = no pool)
+    WORKERS: int = 0
+    # Runs stop when confidence intervals of Cykle and PD are narrower
+    # than TARGET_PRECISION * estimate (0 = always ITERATIONS runs).
+    # ITERATIONS is then the maximum number of runs
+    TARGET_PRECISION: float = 0.0
+    # Minimum number of runs before the stopping rule is checked
+    MIN_ITERATIONS: int = 10
+    # Confidence level of the intervals
+    CONFIDENCE: float = 0.95
+    # Quantile estimated by the stopping rule (0 = mean)
+    TARGET_QUANTILE: float = 0.0
+    # Simulation steps drawn as one frame in visual mode
+    # (0 = as many steps as fit in 1/FPS of a second)
+    STEPS_PER_FRAME: int = 1
+    # Format of screenshots saved after visual runs, "png" or "bmp"
+    # (bmp is not compressed, so it is much faster to write)
+    SCREENSHOT_FORMAT: str = SCREENSHOT_PNG
+    # Screenshot is saved after every SCREENSHOT_EVERY-th visual run (0 = none)
+    SCREENSHOT_EVERY: int = 1
+
 
     @classmethod
     def from_defaults(cls, make_settings_file: bool = True) -> Self:
@@ -186,7 +245,20 @@ class Settings:
             ITERATIONS            = 1,
             DRYRUN                = 0,
             SIMULATION_CYKLES     = 0,
-            IMAGE_PATH            = 'simulation.result.png'
+            IMAGE_PATH            = 'simulation.result.png',
+            ENGINE                = ENGINE_PYTHON,
+            ENSEMBLE_SIZE         = 256,
+            DRAW_MODE             = DRAW_BERNOULLI,
+            EVENT_DRIVEN          = 0,
+            ACTIVE_FRONTIER       = 0,
+            WORKERS               = 0,
+            TARGET_PRECISION      = 0.0,
+            MIN_ITERATIONS        = 10,
+            CONFIDENCE            = 0.95,
+            TARGET_QUANTILE       = 0.0,
+            STEPS_PER_FRAME       = 1,
+            SCREENSHOT_FORMAT     = SCREENSHOT_PNG,
+            SCREENSHOT_EVERY      = 1
         )
 
         if make_settings_file:
@@ -230,7 +302,20 @@ class Settings:
             ITERATIONS            = int(d[ITERATIONS]),
             DRYRUN                = int(d[DRYRUN]),
             SIMULATION_CYKLES     = int(d[SIMULATION_CYKLES]),
-            IMAGE_PATH            = str(d[IMAGE_PATH])
+            IMAGE_PATH            = str(d[IMAGE_PATH]),
+            ENGINE                = str(d.get(ENGINE, ENGINE_PYTHON)),
+            ENSEMBLE_SIZE         = int(d.get(ENSEMBLE_SIZE, 256)),
+            DRAW_MODE             = str(d.get(DRAW_MODE, DRAW_BERNOULLI)),
+            EVENT_DRIVEN          = int(d.get(EVENT_DRIVEN, 0)),
+            ACTIVE_FRONTIER       = int(d.get(ACTIVE_FRONTIER, 0)),
+            WORKERS               = int(d.get(WORKERS, 0)),
+            TARGET_PRECISION      = float(d.get(TARGET_PRECISION, 0.0)),
+            MIN_ITERATIONS        = int(d.get(MIN_ITERATIONS, 10)),
+            CONFIDENCE            = float(d.get(CONFIDENCE, 0.95)),
+            TARGET_QUANTILE       = float(d.get(TARGET_QUANTILE, 0.0)),
+            STEPS_PER_FRAME       = int(d.get(STEPS_PER_FRAME, 1)),
+            SCREENSHOT_FORMAT     = str(d.get(SCREENSHOT_FORMAT, SCREENSHOT_PNG)),
+            SCREENSHOT_EVERY      = int(d.get(SCREENSHOT_EVERY, 1))
         )
 
     @classmethod
@@ -1,33 +1,78 @@
  
 import math
+import signal
 import time
-from   multiprocessing import Pipe, Queue
-import pygame
+from   multiprocessing import Pipe
 from   settings import *
 import symulacja
 
-from symulacja import Symulacja2D as Sim2D
-from   ui import Grid
+from   typing import Callable
+from   runner import run_without_visualisation, simulation_info, run_pool, workers_count, StoppingRule, ResultStream
+from   runner import WarmPool, RUN, QUIT
 
 
 
-data = []
 runs_times = []
 
-def run_with_visualisation(settings: Settings):
+def open_window(settings: Settings) -> tuple:
+    '''
+    Opens pygame window for visual runs, it is shared by all runs of a batch
+
+    Returns:
+    -------
+    tuple
+        (screen, clock, grid, writer of screenshots)
+    '''
+
+    # pygame ładowany dopiero przy wizualizacji, dryrun go nie potrzebuje
+    import pygame
+    from   ui import Grid, ScreenshotWriter
 
     pygame.init()
     screen = pygame.display.set_mode(settings.GRID_SIZE_PIXELS)
     clock  = pygame.time.Clock()
     grid   = Grid(settings)
+    writer = ScreenshotWriter(settings.SCREENSHOT_FORMAT, settings.SCREENSHOT_EVERY)
+
+    return screen, clock, grid, writer
+
+
+
+def close_window(window: tuple):
+    import pygame
+
+    # zrzuty ekranu muszą zostać zapisane przed zamknięciem pygame,
+    # błąd zapisu przechodzi dalej, ale okno i tak jest zamykane
+    try:
+        window[3].close()
+    finally:
+        pygame.quit()
+
+
+
+def run_with_visualisation(settings: Settings, cancelled: Callable[[], bool] = None, window: tuple = None):
+    import pygame
+
+    # bez okna od wywołującego run ma własne okno, zamykane na końcu
+    own_window = window is None
+    if own_window:
+        window = open_window(settings)
+
+    screen, clock, grid, writer = window
     world  = symulacja.Symulacja2D(settings)
 
+    # czysta siatka z poprzedniego runu: jeden blit zamiast rysowania od nowa
+    grid.reset()
     screen.blit(grid.get_surface(), settings.GRID_MARGINS)
     pygame.display.update()
 
     cykles_limited : bool = True if settings.SIMULATION_CYKLES > 0 else False
     cykles = settings.SIMULATION_CYKLES
 
+    # ile kroków symulacji na jedną klatkę, 0 = tyle, ile zmieści się w 1/FPS sekundy
+    steps_per_frame = max(settings.STEPS_PER_FRAME, 0)
+    frame_time      = 1 / max(settings.FPS, 1)
+
     running = True
     pause = False
     while running:
@@ -38,84 +83,78 @@ def run_with_visualisation(settings: Settings):
                 if event.key == pygame.K_SPACE:
                     pause = not pause
 
-        if not pause:
-            gen = world.next_step()
-            grid.update(gen, screen)
+        if cancelled and cancelled():
+            running = False
 
-            state = world.simulation_state()
-            if state == symulacja.PATH_FOUND:
-                grid.update(world.get_fracture_path(mark_connected_nodes=True), screen)
-                running = False
-            
-            elif cykles_limited == True:
-                cykles -= 1
-                if cykles == 0:
+        if not pause:
+            # zmiany z kroków jednej klatki, z każdej komórki rysowany jest tylko
+            # ostatni stan, więc koszt rysowania nie rośnie z liczbą kroków
+            changes: dict[tuple[int, int], int] = {}
+            frame_end = time.perf_counter() + frame_time
+            steps = 0
+
+            while running:
+                for y, x, cell_state in world.next_step():
+                    changes[(y, x)] = cell_state
+                steps += 1
+
+                state = world.simulation_state()
+                if state == symulacja.PATH_FOUND:
+                    for y, x, cell_state in world.get_fracture_path(mark_connected_nodes=True):
+                        changes[(y, x)] = cell_state
                     running = False
-                    
-            pygame.display.update()
-            clock.tick(settings.FPS)
-
-    timee = f'{time.time()}'
-
-    pygame.image.save(screen, 'simulation_result_' + timee+'.png')
-    pygame.quit()
-
-    return (world.P1, world.P2, world.D, world.PD, world.cykles, None, None)
+                
+                elif cykles_limited == True:
+                    if world.cykles >= cykles:
+                        running = False
 
+                if steps_per_frame and steps >= steps_per_frame:
+                    break
+                if not steps_per_frame and time.perf_counter() >= frame_end:
+                    break
 
+            dirty = grid.update([(y, x, cell_state) for (y, x), cell_state in changes.items()], screen)
 
-def run_without_visualisation(settings: Settings):
-    running = True
-    world = symulacja.Symulacja2D(settings)
+            # odświeżane są tylko zmienione kafelki, bez zmian ekran zostaje jak był
+            if dirty:
+                pygame.display.update(dirty)
+            clock.tick(settings.FPS)
 
-    cykles_limited : bool = True if settings.SIMULATION_CYKLES > 0 else False
-    cykles = settings.SIMULATION_CYKLES
+    timee = f'{time.time()}'
 
-    while running:
-        world.next_step()
+    # zapis w tle, następny run nie czeka na kodowanie obrazu
+    writer.save(screen, 'simulation_result_' + timee)
+    if own_window:
+        close_window(window)
 
-        state = world.simulation_state()
-        if state == symulacja.PATH_FOUND:
-            running = False
+    return (world.P1, world.P2, world.D, world.PD, world.cykles, None, None)
 
-        elif cykles_limited == True:
-            cykles -= 1
-            if cykles == 0:
-                running = False
 
-    
-    paths = world.paths_direction
-    if not paths:
-        paths = (None, None)
 
-    return (world.P1, world.P2, world.D, world.PD, world.cykles, paths[Sim2D.NS], paths[Sim2D.WE])              
-    
-    
-def  run_simulation(settings: Settings, pipe: Pipe, queue:Queue):
+def  run_simulation(settings: Settings, pipe: Pipe, warm: WarmPool = None):
 
     s = settings
-    time.sleep(0.5) # żeby mieć pewność że wszystko wystartowało
+    # silnik "ensemble" liczy paczki replik w procesach puli, również przy
+    # jednym procesie, wtedy paczki idą po kolei
+    if s.DRYRUN and (s.ENGINE == ENGINE_ENSEMBLE or workers_count(s) > 1 and s.ITERATIONS > 1):
+        run_pool(settings, pipe, warm)
+        return
+
+    stop = StoppingRule(s)
+    stream = ResultStream(pipe)
+    window = open_window(settings) if not s.DRYRUN else None
 
     for run in range(s.ITERATIONS):
         start = time.time()
         run_info = []
 
-        simulation_info = (
-            run,
-            s.P1_PROBABILITY,
-            s.P2_PROBABILITY,
-            s.HEAL_CYKLES,
-            s.GRID_SIZE[0],
-            s.GRID_SIZE[1],
-            s.SIMULATION_CYKLES
-        )
-        run_info.append(simulation_info)
+        run_info.append(simulation_info(run, s))
 
         if s.DRYRUN: # bez wizualizacji
             result = run_without_visualisation(settings)
 
         elif not s.DRYRUN:# z wizualizają
-            result = run_with_visualisation(settings)
+            result = run_with_visualisation(settings, stream.cancelled, window)
 
         run_info.append(result)
 
@@ -125,27 +164,49 @@ def  run_simulation(settings: Settings, pipe: Pipe, queue:Queue):
         eta        = (s.ITERATIONS - run) / fps
 
         run_info.append((cykle_time, eta, fps))
-        data.append(run_info)
-        queue.put((run, s.ITERATIONS, percent, fps, eta), block=False)
-
-    else:
-        pipe.send(data)
+        stream.add(run_info)
+        stream.progress((run, s.ITERATIONS, percent, fps, eta))
+
+        if stop.add(result) or stream.cancelled():
+            break
+
+    if window:
+        close_window(window)
+    stream.close()
+
+
+
+def serve(pipe: Pipe):
+    """
+    Simulation process of the GUI, lives for the whole session. Waits for
+    (RUN, settings) commands and runs batches one after another, pool
+    of workers is kept between batches. Batch is stopped by CANCEL,
+    process ends on QUIT or when the GUI closes its end of the pipe.
+    SIGTERM (Process.terminate of the GUI) also ends it through finally,
+    so workers of the pool are not left behind
+    """
+
+    def terminate(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+    warm = WarmPool()
+
+    try:
+        while True:
+            try:
+                command, settings = pipe.recv()
+            except EOFError:
+                break
+
+            if command == QUIT:
+                break
+
+            # CANCEL, który przyszedł już po końcu serii, nie ma znaczenia
+            if command == RUN:
+                run_simulation(settings, pipe, warm)
+    finally:
+        # drugi SIGTERM nie może przerwać zamykania puli
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        warm.close()
         pipe.close()
-
-
-
-
-
-
-        
-
-
-    
-
-
-
-
-
-
-
-
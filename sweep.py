@@ -0,0 +1,146 @@
+"""
+Parameter sweep: runs ITERATIONS dryruns for every point of a grid of
+P1_PROBABILITY, P2_PROBABILITY, HEAL_CYKLES, GRID_SIZE and SIMULATION_CYKLES
+values. All runs of all points are scheduled on one worker pool.
+
+Sweep is described by a dict, e.g.
+
+    {
+        "P1_PROBABILITY": {"start": 0.001, "stop": 0.005, "step": 0.001},
+        "P2_PROBABILITY": [0.01, 0.02],
+        "GRID_SIZE": [[50, 50], [100, 100]]
+    }
+
+list gives values directly, dict gives an arithmetic range with inclusive
+stop, parameters that are missing keep their value from Settings.
+"""
+
+import dataclasses
+import itertools
+import json
+from   multiprocessing import Pool
+from   typing import Callable
+from   settings import *
+from   settings import Settings
+
+from runner import COLUMNS, dry_run, simulation_info, table_row, workers_count
+
+
+SWEEP_PARAMETERS = (P1_PROBABILITY, P2_PROBABILITY, HEAL_CYKLES, GRID_SIZE, SIMULATION_CYKLES)
+
+
+
+def expand_values(name: str, values) -> list:
+    '''
+    Expands list, range dict or single value of a sweep parameter to
+    a list of values
+
+    Raises:
+    ------
+    ValueError
+        if name is not one of SWEEP_PARAMETERS
+    '''
+
+    if name not in SWEEP_PARAMETERS:
+        raise ValueError(f'Parameter {name} can not be swept')
+
+    if isinstance(values, dict):
+        start, stop = values["start"], values["stop"]
+        step = values.get("step", 1)
+        count = int((stop - start) / step + 1e-9) + 1
+        # zaokrąglenie usuwa błędy sumowania liczb zmiennoprzecinkowych
+        values = [round(start + i * step, 12) for i in range(count)]
+
+    elif not isinstance(values, (list, tuple)) or (name == GRID_SIZE and not isinstance(values[0], (list, tuple))):
+        values = [values]
+
+    if name == GRID_SIZE:
+        return [tuple(int(num) for num in size) for size in values]
+
+    kind = float if name in (P1_PROBABILITY, P2_PROBABILITY) else int
+    return [kind(value) for value in values]
+
+
+
+def sweep_points(spec: dict) -> list[dict]:
+    '''
+    Cartesian product of values of all swept parameters
+
+    Returns:
+    -------
+    list[dict]
+        settings overrides of every parameter point
+    '''
+
+    names = [name for name in SWEEP_PARAMETERS if name in spec]
+    values = [expand_values(name, spec[name]) for name in names]
+
+    return [dict(zip(names, point)) for point in itertools.product(*values)]
+
+
+
+def point_key(info: tuple) -> tuple:
+    '''
+    Key of parameter point of the run: (P1, P2, HEAL_CYKLES, X, Y, SIMULATION_CYKLES)
+    '''
+
+    return info[1:]
+
+
+
+def run_sweep(settings: Settings, spec: dict, progress: Callable[[int, int], None] = None) -> dict[tuple, list[tuple]]:
+    '''
+    Runs settings.ITERATIONS dryruns of every point of the sweep on
+    a pool of settings.WORKERS processes
+
+    Parameters:
+    ----------
+    settings: Settings
+        base settings, swept parameters are replaced for every point
+
+    spec: dict
+        parameter -> list of values or {"start", "stop", "step"} range
+
+    progress: Callable[[int, int], None]
+        called with (finished runs, all runs) after every run
+
+    Returns:
+    -------
+    dict[tuple, list[tuple]]
+        point_key -> rows of COLUMNS in run order
+    '''
+
+    points = [dataclasses.replace(settings, **point) for point in sweep_points(spec)]
+    # uruchomienia przeplatane między punktami, żeby wolne punkty nie zostały na koniec
+    jobs = [(point, run) for run in range(settings.ITERATIONS) for point in points]
+
+    table: dict[tuple, list] = {point_key(simulation_info(0, point)): [] for point in points}
+    workers = max(1, min(workers_count(settings), len(jobs)))
+
+    with Pool(workers) as pool:
+        for done, (info, result, cykle_time) in enumerate(pool.imap_unordered(dry_run, jobs), 1):
+            table[point_key(info)].append((info[0], table_row(info, result, (cykle_time, 0, 1 / cykle_time))))
+
+            if progress:
+                progress(done, len(jobs))
+
+    return {key: [row for _, row in sorted(rows)] for key, rows in table.items()}
+
+
+
+def load_spec(name: str) -> dict:
+    with open(name, 'r') as f:
+        return json.load(f)
+
+
+
+def save_table(table: dict[tuple, list[tuple]], name: str) -> None:
+    '''
+    Writes rows of all points to a csv file with COLUMNS header
+    '''
+
+    with open(name, 'w') as f:
+        f.write(';'.join(COLUMNS) + '\n')
+        for rows in table.values():
+            for row in rows:
+                f.write(';'.join(str(value) for value in row) + '\n')
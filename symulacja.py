@@ -1,18 +1,51 @@
+import math
 import time
 import random
 
+from array import array
 from typing import Iterable
 from settings import *
 from settings import Settings
-from unionfind import DisjointSet
+from unionfind import ArrayDisjointSet
 
 
-import graph
-
 CYKLES_LIMIT_REACHED: int = 100
 PATH_FOUND          : int = 101
 SIMULATION_RUNNING  : int = 102
 
+# bity krawędzi siatki, których dotyka zbiór PERMANENT komórek
+BOUNDARY_A          : int = 1
+BOUNDARY_B          : int = 2
+BOUNDARY_C          : int = 4
+BOUNDARY_D          : int = 8
+SPAN_NS             : int = BOUNDARY_A | BOUNDARY_C
+SPAN_WE             : int = BOUNDARY_B | BOUNDARY_D
+
+
+
+def make_simulation(settings: Settings) -> 'Symulacja2D':
+    '''
+    Creates simulation engine selected by settings.ENGINE.
+    Single world of the "ensemble" engine is run by Symulacja2DNumpy
+
+    Raises:
+    ------
+    ValueError
+        if engine name is unknown
+    '''
+
+    if settings.ENGINE == ENGINE_PYTHON:
+        return Symulacja2D(settings)
+
+    elif settings.ENGINE == ENGINE_NUMPY or settings.ENGINE == ENGINE_ENSEMBLE:
+        # numpy ładowany tylko wtedy, gdy jest potrzebny
+        from symulacja_numpy import Symulacja2DNumpy
+        return Symulacja2DNumpy(settings)
+
+    raise ValueError(f'Unknown simulation engine: {settings.ENGINE}')
+
+
+
 class Symulacja2D:
     NS = 0
     WE = 1
@@ -24,8 +57,17 @@ class Symulacja2D:
         __frame: list[list[Cell]]
             list (matrix) of Cells
 
+        __back: list[list[int]]
+            second frame buffer, next generation is written here and the
+            buffers are swapped. Kept equal to __frame between steps
+
+        __pressure: list[list[int]]
+            defect pressure of every cell, sum of nerby_defect() weights of
+            its four neighbours in __frame. Updated on every change of a cell
+
         __changed: list[tuple[int, int, int]]
-            list od cells that have changed since previoues generation
+            list od cells that have changed since previoues generation,
+            the same list is cleared and returned by every next_step()
 
         __width: int
             world width ( number of cells in axis X)
@@ -42,6 +84,17 @@ class Symulacja2D:
 
         __found_path: list(tuples[int, int, int])
             contains list of cells that destroyed grid
+
+        _heal_wheel: list[list[tuple[int, int]]]
+            timing wheel of D cells, bucket (cykle % HEAL_CYKLES) holds cells
+            which heal in that cycle. D cells keep DEFECT + HEAL_CYKLES value
+            until their timer fires
+
+        _hot: set[tuple[int, int]]
+            P2, D and healing cells, tracked in ACTIVE_FRONTIER mode
+
+        _recent: set[tuple[int, int]]
+            cells changed in the previous cycle, tracked in ACTIVE_FRONTIER mode
      
         '''
         self.__frame: list[list[int]] = []
@@ -50,15 +103,24 @@ class Symulacja2D:
 
         self._width, self._height  = self.settings.GRID_SIZE
 
-        self._disjoint_set_AC = DisjointSet()
-        self._disjoint_set_BD = DisjointSet()
+        # id komórek ramki to 0..n-1, superkomórki A, B, C, D dostają kolejne id
+        cells = (self._width + 2) * (self._height + 2)
+        self._supercells: tuple[int, int, int, int] = (cells, cells + 1, cells + 2, cells + 3)
+
+        # jeden zbiór dla PERMANENT komórek, korzeń pamięta dotknięte krawędzie
+        self._disjoint_set = ArrayDisjointSet(cells)
+        self._percolation: list[bool] = [False, False]
+
+        # bufory BFS szukającego ścieżki pęknięcia, tworzone przy pierwszym szukaniu
+        self._bfs_inside: bytearray = None
+        self._bfs_prev: array = None
+        self._bfs_succ: array = None
         
-        self.edge_cells = set()
         self._seed = self._width
         self._path_starting_point: int = None
 
         self.make_world()
-        self._make_disjoint_sets()
+        self._make_buffers()
 
         self._P1_counter: int = self._width * self._height
         self._P2_counter: int = 0
@@ -67,6 +129,7 @@ class Symulacja2D:
 
         self.simulation_running: bool = True
         self.cykles_counter: int = 0
+        self._quiescent: bool = True
 
         self.connectivity_test_result = None
         self.defecty_d = []
@@ -114,52 +177,59 @@ class Symulacja2D:
 
   
 
-    def _make_disjoint_sets(self) -> None:
-        self.__a = set()
-        self.__b = set()
-        self.__c = set()
-        self.__d = set()
-        encode = self._encode_id
+    def _boundary(self, y: int, x: int) -> int:
+        '''
+        Returns BOUNDARY_* bit of the EDGE cell (y, x)
+        '''
+
+        if y == 0:
+            return BOUNDARY_A
+        elif y == self._height + 1:
+            return BOUNDARY_C
+        elif x == self._width + 1:
+            return BOUNDARY_B
+        return BOUNDARY_D
+
+
+
+    def _spanning(self, boundaries: int) -> None:
+        '''
+        Records percolation when a set touches opposite edges
+        '''
+
+        if boundaries & SPAN_NS == SPAN_NS:
+            self._percolation[Symulacja2D.NS] = True
+        if boundaries & SPAN_WE == SPAN_WE:
+            self._percolation[Symulacja2D.WE] = True
 
-        w = self._width
-        h = self._height
 
-        unionAC = self._disjoint_set_AC
-        unionBD = self._disjoint_set_BD
-
-        unionAC.makeset(self.settings.SUPERCELL_A)
-        unionBD.makeset(self.settings.SUPERCELL_B)
-        unionAC.makeset(self.settings.SUPERCELL_C)
-        unionBD.makeset(self.settings.SUPERCELL_D)
-
-        for i in range(1, w + 1):
-            #A
-            cell_id = encode(0, i)
-            unionAC.makeset(cell_id)
-            unionAC.union(cell_id, self.settings.SUPERCELL_A)
-            self.__a.add(cell_id)
-
-            #C
-            cell_id = encode(h + 1, i) 
-            unionAC.makeset(cell_id)
-            unionAC.union(cell_id, self.settings.SUPERCELL_C)
-            self.__c.add(cell_id)
-
-        for i in range(1, h + 1):
-            #B
-            cell_id = encode(i, w + 1)
-            unionBD.makeset(cell_id)
-            unionBD.union(cell_id, self.settings.SUPERCELL_B)
-            self.__b.add(cell_id)
-
-
-            #D
-            cell_id = encode(i, 0)
-            unionBD.makeset(cell_id)
-            unionBD.union(cell_id,self.settings.SUPERCELL_D)
-            self.__d.add(cell_id)
-            
-        self.edge_cells  = self.__a | self.__b | self.__c | self.__d
+
+    def _join_permanent(self, enc: int, neighbors: Iterable[tuple[int, int, int]]) -> None:
+        '''
+        Adds new PERMANENT cell to the disjoint set, joins it with
+        PERMANENT neighbours and marks edges it touches
+
+        Parameters:
+        ----------
+        enc: int
+            id of the cell
+
+        neighbors: Iterable[tuple[int, int, int]]
+            (y, x, state) of the cell neighbours
+        '''
+
+        s = self.settings
+        union_find = self._disjoint_set
+        union_find.makeset(enc)
+
+        boundaries = 0
+        for b, a, n in neighbors:
+            if n == s.PERMANENT:
+                union_find.union(enc, self._encode_id(b, a))
+            elif n == s.EDGE:
+                boundaries |= self._boundary(b, a)
+
+        self._spanning(union_find.flag(enc, boundaries))
 
 
 
@@ -201,16 +271,9 @@ class Symulacja2D:
         bool
             True if defects damaged grid otherwise False
         '''
-        A = self.settings.SUPERCELL_A
-        B = self.settings.SUPERCELL_B
-        C = self.settings.SUPERCELL_C
-        D = self.settings.SUPERCELL_D
-
-        AC = self._disjoint_set_AC
-        BD = self._disjoint_set_BD
+        A, B, C, D = self._supercells
 
-        testNS = AC.connected(A, C)
-        testWE = BD.connected(B, D)
+        testNS, testWE = self._percolation
 
         if testNS or testWE:
             self.connectivity_test_result = (testNS, testWE)
@@ -244,92 +307,127 @@ class Symulacja2D:
 
 
 
-    def get_fracture_path(self, mark_connected_nodes: bool = False) -> Iterable[tuple[int, int, int]]:
-
-        start = time.time()
-        A: int = self.settings.SUPERCELL_A
-        B: int = self.settings.SUPERCELL_B
-        C: int = self.settings.SUPERCELL_C
-        D: int = self.settings.SUPERCELL_D
+    def _bfs_path(self, cells: list[int], sources: list[int], targets: list[int]) -> list[int]:
+        '''
+        Finds the shortest path from any of sources to any of targets going
+        only through given cells. Bidirectional multi-source BFS on flat
+        cell ids, fronts grow from both ends and the smaller one is expanded.
+        Preallocated buffers are cleaned after use.
 
-        AC: DisjointSet = self._disjoint_set_AC
-        BD: DisjointSet = self._disjoint_set_BD
+        Returns:
+        -------
+        list[int]
+            ids of cells from a source to a target, empty if there is no path
+        '''
 
-        edge_A: set = self.__a
-        edge_B: set = self.__b
-        edge_C: set = self.__c
-        edge_D: set = self.__d
+        if self._bfs_inside is None:
+            cells_count = (self._width + 2) * (self._height + 2)
+            self._bfs_inside = bytearray(cells_count)
+            self._bfs_prev = array('i', [-1]) * cells_count
+            self._bfs_succ = array('i', [-1]) * cells_count
 
-        supercells = set([A,B,C,D])
+        inside = self._bfs_inside
+        prev = self._bfs_prev   # poprzednik od strony sources
+        succ = self._bfs_succ   # następnik od strony targets
+        step = self._width + 2
+        offsets = (-step, step, -1, 1)
 
-        Graph = graph.Graph(weighted=False, digraph=False)
-        starting_point: int = self._path_starting_point
-        cells = []
-        path  = []
+        for cell in cells:
+            inside[cell] = 1
+        for cell in sources:
+            prev[cell] = cell
+        for cell in targets:
+            succ[cell] = cell
+
+        touched = sources + targets
+        meet = next((cell for cell in sources if succ[cell] != -1), -1)
+        front_s, front_t = sources, targets
+
+        while meet == -1 and front_s and front_t:
+            expand_s = len(front_s) <= len(front_t)
+            front, seen, other = (front_s, prev, succ) if expand_s else (front_t, succ, prev)
+
+            new_front = []
+            for cell in front:
+                for offset in offsets:
+                    n = cell + offset
+                    if inside[n] and seen[n] == -1:
+                        seen[n] = cell
+                        touched.append(n)
+                        if other[n] != -1:
+                            meet = n
+                            break
+                        new_front.append(n)
+
+                if meet != -1:
+                    break
+
+            if expand_s:
+                front_s = new_front
+            else:
+                front_t = new_front
+
+        path = []
+        if meet != -1:
+            node = meet
+            while prev[node] != node:
+                path.append(node)
+                node = prev[node]
+            path.append(node)
+            path.reverse()
+
+            node = meet
+            while succ[node] != node:
+                node = succ[node]
+                path.append(node)
 
+        for cell in cells:
+            inside[cell] = 0
+        for cell in touched:
+            prev[cell] = -1
+            succ[cell] = -1
 
-        #wez wszystkie weżły które utworzyły rozdarcie w siatce
-        if starting_point == A or starting_point == C:
-            cells = AC.return_members_set(starting_point)
+        return path
 
-        elif starting_point == B or starting_point == D:
-            cells = BD.return_members_set(starting_point)
 
-        # print("PATHFINDING: Building graph -> start")
-        building_graph = time.time()
-        for cell in cells:
-            Graph.add_node(cell)
 
+    def get_fracture_path(self, mark_connected_nodes: bool = False) -> Iterable[tuple[int, int, int]]:
 
-        for node in Graph.nodes():
-            y, x = self._decode_id(node)
-            for b, a in self._vicinity(y, x):
+        start = time.time()
+        A, B, C, D = self._supercells
+        w, h = self._width, self._height
 
-                neighbor = self._encode_id(b, a)
-                if neighbor in Graph \
-                    and not (neighbor in edge_B and node in edge_D) \
-                    and not (neighbor in edge_D and node in edge_B):
-                    Graph.add_edge(node, neighbor)
+        union_find: ArrayDisjointSet = self._disjoint_set
+        starting_point: int = self._path_starting_point
+        decode = self._decode_id
+        cells = []
+        path  = []
 
-        #połącz superkomórki z komórkami brzegowymi
+        #wez wszystkie weżły które utworzyły rozdarcie w siatce
+        #(posortowane, żeby ścieżka nie zależała od kolejności łączenia zbiorów)
+        #i szukaj ścieżki od wiersza/kolumny przy C/D do wiersza/kolumny przy A/B
         if starting_point == A or starting_point == C:
-            for node in edge_A:
-                if node in Graph:
-                    Graph.add_edge(A, node)
-
-            for node in edge_C:
-                if node in Graph:
-                    Graph.add_edge(C, node)
-
-            path = Graph.shortest_path_bfs(C, A)
+            cells = sorted(union_find.return_flagged_list(SPAN_NS))
+            sources = [cell for cell in cells if decode(cell)[0] == h]
+            targets = [cell for cell in cells if decode(cell)[0] == 1]
+            path = self._bfs_path(cells, sources, targets)
 
         elif starting_point == B or starting_point == D:
-            for node in edge_B:
-                if node in Graph:
-                    Graph.add_edge(B, node)
-
-            for node in edge_D:
-                if node in Graph:
-                    Graph.add_edge(D, node)
-
-            path = Graph.shortest_path_bfs(D, B)
-        
-        bg = f'PATHFINDING: Building graph -> end {time.time() - building_graph: 6f}'
-        # print(bg)
+            cells = sorted(union_find.return_flagged_list(SPAN_WE))
+            sources = [cell for cell in cells if decode(cell)[1] == 1]
+            targets = [cell for cell in cells if decode(cell)[1] == w]
+            path = self._bfs_path(cells, sources, targets)
 
         returned_elements = []
 
-        #usun superkomorki i komorki brzegowe z listy
         if mark_connected_nodes:
             for elem in cells:
-                if elem not in supercells and elem not in self.edge_cells:
-                    y, x = self._decode_id(elem)
-                    returned_elements.append((y - 1, x - 1, self.settings.DESTRUCTION_PATH))
+                y, x = decode(elem)
+                returned_elements.append((y - 1, x - 1, self.settings.DESTRUCTION_PATH))
 
         for elem in path:
-            if elem not in supercells and elem not in self.edge_cells:
-                y, x = self._decode_id(elem)
-                returned_elements.append((y - 1, x - 1, self.settings.FRACTURE_PATH))
+            y, x = decode(elem)
+            returned_elements.append((y - 1, x - 1, self.settings.FRACTURE_PATH))
 
         s = f'PATHFINDING: All {time.time() - start: 6f}'
         # print(s)
@@ -361,6 +459,26 @@ class Symulacja2D:
                 
                
 
+    def _make_buffers(self) -> None:
+        '''
+        State of the cell-by-cell engine built next to the frame: second
+        frame buffer, defect pressure, list of grid cells, heal timing
+        wheel and active frontier sets
+        '''
+
+        self.__back: list[list[int]] = [line[:] for line in self.__frame]
+        self.__pressure: list[list[int]] = self._make_pressure()
+        self._grid_cells: list[tuple[int, int]] = [(y, x) for y in range(1, self._height + 1) for x in range(1, self._width + 1)]
+
+        # koło czasowe: D komórki w kubełkach wg cyklu, w którym kończy się leczenie
+        self._heal_wheel: list[list[tuple[int, int]]] = [[] for _ in range(max(self.settings.HEAL_CYKLES, 1))]
+
+        # aktywny front: tylko te komórki i ich sąsiedzi mogą zmienić stan
+        self._hot: set[tuple[int, int]] = set()
+        self._recent: set[tuple[int, int]] = set()
+
+
+
     def _changed(self, y, x, state) -> None:
         '''
         co
@@ -390,192 +508,483 @@ class Symulacja2D:
 
 
 
-    def nerby_defect(self, y, x):
-        f = self.__frame
-        s = 0
+    def _weight(self, state: int) -> int:
+        '''
+        Weight of the cell state in the defect pressure of its neighbours
+        '''
+
         DEFECT = self.settings.DEFECT
 
-        for b, a in self.neighbors(y, x):
-            if f[b][a] < 0:
-                s = s + DEFECT
-            elif f[b][a] == DEFECT:
-                s = s + 0
+        if state < 0:
+            return DEFECT
+        elif state == DEFECT:
+            return 0
+        return state
+
+
+
+    def _make_pressure(self) -> list[list[int]]:
+        frame = self.__frame
+        pressure = [[0] * len(line) for line in frame]
+
+        for y in range(1, len(frame) - 1):
+            for x in range(1, len(frame[y]) - 1):
+                pressure[y][x] = sum(self._weight(frame[b][a]) for b, a in self.neighbors(y, x))
+
+        return pressure
+
+
+
+    def _set_cell(self, y: int, x: int, state: int) -> None:
+        '''
+        Writes state to the current frame and updates pressure of neighbours
+        '''
+
+        line = self.__frame[y]
+        delta = self._weight(state) - self._weight(line[x])
+        line[x] = state
+
+        if delta:
+            pressure = self.__pressure
+            pressure[y - 1][x] += delta
+            pressure[y + 1][x] += delta
+            pressure[y][x - 1] += delta
+            pressure[y][x + 1] += delta
+
+
+
+    def nerby_defect(self, y, x):
+        return self.__pressure[y][x] > self.settings.DEFECT
+
+
+
+
+    def _skip(self, log_q: float) -> int:
+        '''
+        Draws number of failed trials before the next hit
+        (geometric distribution)
+
+        Parameters:
+        ----------
+        log_q: float
+            log(1 - p), where p is probability of a hit
+        '''
+
+        return int(math.log(1.0 - random.random()) / log_q)
+
+
+
+    def _draw(self, start: int, probability: float, state: int, marker: int) -> list[int]:
+        '''
+        Geometric skip-sampling of defects. Cells are numbered row by row
+        from 0 to W*H - 1, only hits are visited. Hits on cells in other
+        states than given one are discarded, so every cell of the population
+        is still an independent Bernoulli trial with given probability.
+
+        Parameters:
+        ----------
+        start: int
+            number of the first cell taking part in the draw
+        probability: float
+            probability of a hit
+        state: int
+            population of cells (P1 or P2)
+        marker: int
+            value written to drawn cells
+
+        Returns:
+        -------
+        list[int]
+            numbers of drawn cells
+        '''
+
+        hits = []
+        if probability <= 0:
+            return hits
+
+        frame = self.__frame
+        w = self._width
+        cells = w * self._height
+        log_q = math.log(1.0 - probability) if probability < 1 else -math.inf
+
+        i = start + self._skip(log_q)
+        while i < cells:
+            y, x = divmod(i, w)
+            line = frame[y + 1]
+            if line[x + 1] == state:
+                self._set_cell(y + 1, x + 1, marker)
+                hits.append(i)
+
+            i += 1 + self._skip(log_q)
+
+        return hits
+
+
+
+    def _fast_forward(self, marker_P1: int, marker_P2: int) -> list[tuple[int, int]]:
+        '''
+        Event-driven step for a quiescent grid, which does not change
+        without new defects (no D cells, P1 and P2 cells are stable).
+        Samples number of idle cycles before the next draw hit, moves
+        cykles_counter over them and draws defects of the event cycle.
+
+        Cycles are treated as one stream of W*H trials each. Candidates
+        are sampled geometrically with the higher of P1/P2 probabilities
+        and accepted with probability p(state) / p_max, which gives every
+        cell an independent Bernoulli trial, as in losuj()
+
+        Returns:
+        -------
+        list[tuple[int, int]]
+            (y, x) of drawn cells and their neighbours in row by row order,
+            empty list if SIMULATION_CYKLES is reached before the event
+        '''
+
+        s = self.settings
+        frame = self.__frame
+        w = self._width
+        cells = w * self._height
+        limit = s.SIMULATION_CYKLES
+
+        rate = max(s.P1_PROBABILITY, s.P2_PROBABILITY)
+        log_q = math.log(1.0 - rate) if rate < 1 else -math.inf
+
+        i = self._skip(log_q)
+        while True:
+            # kolejny cykl z trafieniem przekroczyłby limit cykli
+            if limit > 0 and self.cykles_counter + i // cells >= limit:
+                self.cykles_counter = limit
+                return []
+
+            y, x = divmod(i % cells, w)
+            cell = frame[y + 1][x + 1]
+            if cell == s.P1:
+                probability = s.P1_PROBABILITY
+            elif cell == s.P2:
+                probability = s.P2_PROBABILITY
             else:
-                s = s + f[b][a]
+                probability = 0
 
-        return True if s > DEFECT else False
+            if random.random() * rate < probability:
+                break
 
+            i += 1 + self._skip(log_q)
 
+        idle, first = divmod(i, cells)
+        self.cykles_counter += idle
 
+        self._set_cell(y + 1, x + 1, marker_P1 if cell == s.P1 else marker_P2)
+        hits = [first]
+        hits += self._draw(first + 1, s.P1_PROBABILITY, s.P1, marker_P1)
+        hits += self._draw(first + 1, s.P2_PROBABILITY, s.P2, marker_P2)
 
-    def losuj(self, marker_P1, marker_P2):
+        affected = set()
+        for hit in hits:
+            y, x = divmod(hit, w)
+            affected.add((y + 1, x + 1))
+            for b, a in self.neighbors(y + 1, x + 1):
+                if 0 < b <= self._height and 0 < a <= w:
+                    affected.add((b, a))
+
+        return sorted(affected)
+
+
+
+    def _heal_expired(self) -> None:
+        '''
+        Fires timers of the timing wheel. D cells whose heal countdown
+        ends in this cycle get DEFECT value and are healed by new_cell_state().
+        Cells that became PERMANENT in the meantime are skipped.
+        '''
+
+        s = self.settings
         frame = self.__frame
+        bucket = self._heal_wheel[self.cykles_counter % len(self._heal_wheel)]
 
+        for y, x in bucket:
+            if frame[y][x] > s.DEFECT and frame[y][x] < s.PERMANENT:
+                self._set_cell(y, x, s.DEFECT)
+
+        bucket.clear()
+
+
+
+    def losuj(self, marker_P1, marker_P2):
         s = self.settings
 
+        self._heal_expired()
+
+        if s.DRAW_MODE == DRAW_GEOMETRIC:
+            self._draw(0, s.P1_PROBABILITY, s.P1, marker_P1)
+            self._draw(0, s.P2_PROBABILITY, s.P2, marker_P2)
+            return
+
         for y in range(1, self._height + 1):
             for x in range( 1, self._width + 1):
                 cell = self.__frame[y][x]
 
                 if cell == s.P1:
                     if random.random() < s.P1_PROBABILITY:
-                        frame[y][x] = marker_P1
+                        self._set_cell(y, x, marker_P1)
 
                 
                 elif cell == s.P2:
                     if random.random() < s.P2_PROBABILITY:
-                        frame[y][x] = marker_P2
+                        self._set_cell(y, x, marker_P2)
 
-                elif cell > s.DEFECT and cell < s.PERMANENT:
-                    frame[y][x] = frame[y][x] - 1
-                
 
-  
 
+    def new_cell_state(self, markerp1, markerp2, cells: Iterable[tuple[int, int]] = None):
+        '''
+        Calculates next generation of the grid into the back buffer
 
+        Parameters:
+        ----------
+        markerp1, markerp2: int
+            values of cells drawn in losuj()
 
-    def new_cell_state(self, markerp1, markerp2):
+        cells: Iterable[tuple[int, int]]
+            (y, x) of cells to update, in row by row order. Other cells keep
+            their values. All cells of the grid by default
+
+        Returns:
+        -------
+        list[list[int]]
+            back buffer with the next generation, to be passed to _swap()
+        '''
 
         s = self.settings
-        next_frame = []
+        frame = self.__frame
+        next_frame = self.__back
+        pressure = self.__pressure # nerby_defect() jako odczyt z tablicy
 
-        for y in range(self._height + 2):
-            line = []
-            for x in range(self._width + 2):
-                cell = self.__frame[y][x]
-                if x > 0 and y > 0 and x < self._width + 1 and y < self._height + 1:
-                    
-                    if cell == markerp1 or cell == markerp2:
-                        if self.nerby_defect(y, x) == True:
-                            cell = s.PERMANENT
-                            self._changed(y, x, s.PERMANENT)
-                            enc = self._encode_id(y, x)
-                            self._disjoint_set_AC.makeset(enc)
-                            self._disjoint_set_BD.makeset(enc)
-
-                            if line[x - 1] == s.P1:
-                                line[x -1] = s.P2
-                                self._changed(y, x - 1, s.P2)
-                            
-                            if next_frame[y - 1][x] == s.P1:
-                                next_frame[y - 1][x] = s.P2
-                                self._changed(y - 1, x, s.P2)
-
-                            for b, a, state in self.neighbors2(y, x, line, next_frame):
-                                n = state
-                                if n == s.PERMANENT or n == s.EDGE:
-                                    nid = self._encode_id(b, a)
-                                    self._disjoint_set_AC.union(enc, nid)
-                                    self._disjoint_set_BD.union(enc, nid)
-
-                            if cell == markerp1:
-                                self._P1_counter -= 1
-                            else:
-                                self._P2_counter -= 1
-                            self._PD_counter += 1
-
-                        else:
-                            cell = s.DEFECT + s.HEAL_CYKLES
-                            if line[x - 1] == s.P1:
-                                line[x - 1] = s.P2
-                                self._changed(y, x - 1, s.P2)
-
-                            if next_frame[y - 1][x] == s.P1:
-                                next_frame[y - 1][x] = s.P2
-                                self._changed(y - 1, x, s.P2)
-                            
-                            # if self.__frame[y][x + 1] == s.P1:
-                            #     self.__frame[y][x+1] = s.P2
-                            #     self._changed(y, x + 1, s.P2)
-
-                            # if self.__frame[y+1][x] == s.P1:
-                            #     self.__frame[y+1][x] = s.P2
-                            #     self._changed(y + 1, x, s.P2)
-                            
-                            self._changed(y, x, s.DEFECT)
-                            if cell == markerp1:
-                                self._P1_counter -= 1
-                            else:
-                                self._P2_counter -= 1
-                            self._D_counter += 1
-
-
-                    elif cell == s.P1:
-                        if self.nerby_defect(y, x) == True:
-                            cell = s.P2
-                            self._changed(y, x, cell)
-                            self._P1_counter -= 1
-                            self._P2_counter += 1
-
-                        else:
-                            cell == s.P1
-
-                    elif cell == s.P2:
-                        if self.nerby_defect(y, x) == True:
-                            cell = s.P2
-
-                        else:
-                            cell = s.P1
-                            self._changed(y, x, cell)
-                            self._P2_counter -= 1
-                            self._P1_counter += 1
-
-                    elif cell == s.DEFECT:
-                        if line[x - 1] >= s.DEFECT or next_frame[y - 1][x] >= s.DEFECT or \
-                            self.__frame[y + 1][x] >= s.DEFECT or self.__frame[y][x + 1] >= s.DEFECT:
-                            cell = s.P2
-                        else:
-                            cell = s.P1
-                        self._changed(y, x, cell)
-                        self._P1_counter += 1
-                        self._D_counter -= 1
-                      
-
-                    elif cell > s.DEFECT and cell < s.PERMANENT:
-                        if self.nerby_defect(y, x) == True:
-                            cell = s.PERMANENT
-                            self._changed(y, x, cell)
-                            # if line[x - 1] == s.P1:
-                            #     line[x - 1] = s.P2
-                            #     self._changed(y, x - 1, s.P2)
-
-                            # if next_frame[y-1][x]==s.P1:
-                            #     next_frame[y-1][x] = s.P2
-                            #     self._changed(y-1, x, s.P2)
-
-                            enc = self._encode_id(y, x)
-                            self._disjoint_set_AC.makeset(enc)
-                            self._disjoint_set_BD.makeset(enc)
-
-                            for b, a, state in self.neighbors2(y, x, line, next_frame):
-                                n = state
-                                if n == s.PERMANENT or n == s.EDGE:
-                                    nid = self._encode_id(b, a)
-                                    self._disjoint_set_AC.union(enc, nid)
-                                    self._disjoint_set_BD.union(enc, nid)
-                            
-                            self._D_counter -= 1
-                            self._PD_counter += 1
+        if cells is None:
+            cells = self._grid_cells
 
-                        
+        for y, x in cells:
+            cell = frame[y][x]
+            line = next_frame[y]
+            if cell == markerp1 or cell == markerp2:
+                if pressure[y][x] > s.DEFECT:
+                    cell = s.PERMANENT
+                    self._changed(y, x, s.PERMANENT)
 
-                line.append(cell)
+                    if line[x - 1] == s.P1:
+                        line[x -1] = s.P2
+                        self._changed(y, x - 1, s.P2)
 
-            else:
-                next_frame.append(line)
+                    if next_frame[y - 1][x] == s.P1:
+                        next_frame[y - 1][x] = s.P2
+                        self._changed(y - 1, x, s.P2)
+
+                    self._join_permanent(self._encode_id(y, x), self.neighbors2(y, x, line, next_frame))
+
+                    if cell == markerp1:
+                        self._P1_counter -= 1
+                    else:
+                        self._P2_counter -= 1
+                    self._PD_counter += 1
+
+                else:
+                    cell = s.DEFECT + s.HEAL_CYKLES
+                    if s.HEAL_CYKLES > 0:
+                        self._heal_wheel[self.cykles_counter % len(self._heal_wheel)].append((y, x))
+
+                    if line[x - 1] == s.P1:
+                        line[x - 1] = s.P2
+                        self._changed(y, x - 1, s.P2)
+
+                    if next_frame[y - 1][x] == s.P1:
+                        next_frame[y - 1][x] = s.P2
+                        self._changed(y - 1, x, s.P2)
+
+                    # if self.__frame[y][x + 1] == s.P1:
+                    #     self.__frame[y][x+1] = s.P2
+                    #     self._changed(y, x + 1, s.P2)
+
+                    # if self.__frame[y+1][x] == s.P1:
+                    #     self.__frame[y+1][x] = s.P2
+                    #     self._changed(y + 1, x, s.P2)
+
+                    self._changed(y, x, s.DEFECT)
+                    if cell == markerp1:
+                        self._P1_counter -= 1
+                    else:
+                        self._P2_counter -= 1
+                    self._D_counter += 1
+
+
+            elif cell == s.P1:
+                if pressure[y][x] > s.DEFECT:
+                    cell = s.P2
+                    self._changed(y, x, cell)
+                    self._P1_counter -= 1
+                    self._P2_counter += 1
+
+                else:
+                    cell == s.P1
+
+            elif cell == s.P2:
+                if pressure[y][x] > s.DEFECT:
+                    cell = s.P2
+
+                else:
+                    cell = s.P1
+                    self._changed(y, x, cell)
+                    self._P2_counter -= 1
+                    self._P1_counter += 1
+
+            elif cell == s.DEFECT:
+                if line[x - 1] >= s.DEFECT or next_frame[y - 1][x] >= s.DEFECT or \
+                    self.__frame[y + 1][x] >= s.DEFECT or self.__frame[y][x + 1] >= s.DEFECT:
+                    cell = s.P2
+                else:
+                    cell = s.P1
+                self._changed(y, x, cell)
+                self._P1_counter += 1
+                self._D_counter -= 1
+
+
+            elif cell > s.DEFECT and cell < s.PERMANENT:
+                if pressure[y][x] > s.DEFECT:
+                    cell = s.PERMANENT
+                    self._changed(y, x, cell)
+                    # if line[x - 1] == s.P1:
+                    #     line[x - 1] = s.P2
+                    #     self._changed(y, x - 1, s.P2)
+
+                    # if next_frame[y-1][x]==s.P1:
+                    #     next_frame[y-1][x] = s.P2
+                    #     self._changed(y-1, x, s.P2)
+
+                    self._join_permanent(self._encode_id(y, x), self.neighbors2(y, x, line, next_frame))
+
+                    self._D_counter -= 1
+                    self._PD_counter += 1
+
+            line[x] = cell
 
         return next_frame
                         
 
                 
+    def _swap(self, next_frame: list[list[int]]) -> None:
+        '''
+        Makes next_frame the current frame. Old frame becomes the back buffer
+        and gets values of cells changed in this cycle, so both are equal again.
+        Pressure of neighbours of changed cells is updated on the way
+        '''
+
+        frame = self.__frame
+        pressure = self.__pressure
+        weight = self._weight
+        self.__frame = next_frame
+        self.__back = frame
+
+        for y, x, _ in self.__changed:
+            y += 1
+            x += 1
+            old = frame[y][x]
+            new = next_frame[y][x]
+
+            if old != new:
+                frame[y][x] = new
+                delta = weight(new) - weight(old)
+                pressure[y - 1][x] += delta
+                pressure[y + 1][x] += delta
+                pressure[y][x - 1] += delta
+                pressure[y][x + 1] += delta
+
+        if self.settings.ACTIVE_FRONTIER:
+            self._track_frontier()
+
+
+
+    def _track_frontier(self) -> None:
+        '''
+        Updates _hot and _recent with cells changed in this cycle
+        '''
+
+        s = self.settings
+        frame = self.__frame
+        hot = self._hot
+        recent = self._recent
+        recent.clear()
+
+        for y, x, _ in self.__changed:
+            cell = (y + 1, x + 1)
+            recent.add(cell)
+            state = frame[y + 1][x + 1]
+
+            if state == s.P2 or (state >= s.DEFECT and state < s.PERMANENT):
+                hot.add(cell)
+            else:
+                hot.discard(cell)
+
+
+
+    def _frontier(self, marker_P1: int, marker_P2: int) -> list[tuple[int, int]]:
+        '''
+        Fires heal timers and draws defects like losuj() in geometric mode,
+        then returns cells the transition pass has to visit.
+
+        Other cells cannot change: P1 cell changes only next to a drawn,
+        D, healing or new PERMANENT cell, PERMANENT cells never change.
+        Cells next to PERMANENT ones become P2 at the latest one cycle
+        after promotion and stay P2.
+
+        Returns:
+        -------
+        list[tuple[int, int]]
+            (y, x) of drawn, P2, D and healing cells, cells changed in the
+            previous cycle and their neighbours, in row by row order
+        '''
+
+        s = self.settings
+        w = self._width
+        h = self._height
+
+        self._heal_expired()
+        hits = self._draw(0, s.P1_PROBABILITY, s.P1, marker_P1)
+        hits += self._draw(0, s.P2_PROBABILITY, s.P2, marker_P2)
+
+        sources = self._hot | self._recent
+        for hit in hits:
+            y, x = divmod(hit, w)
+            sources.add((y + 1, x + 1))
+
+        active = set(sources)
+        for y, x in sources:
+            active.update(self.neighbors(y, x))
+
+        return sorted(cell for cell in active if 0 < cell[0] <= h and 0 < cell[1] <= w)
+
+
+
     def next_step(self):
-        self.__changed = []
+        self.__changed.clear()
         marker_p1 = -1
         marker_p2 = -10
-        self.losuj(marker_p1, marker_p2)         
-        self.__frame = self.new_cell_state(marker_p1, marker_p2)
+        s = self.settings
+
+        if s.EVENT_DRIVEN and self._quiescent and max(s.P1_PROBABILITY, s.P2_PROBABILITY) > 0:
+            cells = self._fast_forward(marker_p1, marker_p2)
+            if not cells:
+                return self.__changed
+            self._swap(self.new_cell_state(marker_p1, marker_p2, cells))
+
+        elif s.ACTIVE_FRONTIER:
+            cells = self._frontier(marker_p1, marker_p2)
+            self._swap(self.new_cell_state(marker_p1, marker_p2, cells))
+
+        else:
+            self.losuj(marker_p1, marker_p2)         
+            self._swap(self.new_cell_state(marker_p1, marker_p2))
 
         self.cykles_counter += 1
+
+        # brak zmian i brak defektów D: siatka nie zmieni się do następnego trafienia
+        self._quiescent = not self.__changed and self._D_counter == 0
             
         return self.__changed
 
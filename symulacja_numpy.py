@@ -0,0 +1,380 @@
+import numpy as np
+
+from settings import Settings
+from symulacja import Symulacja2D, BOUNDARY_A, BOUNDARY_B, BOUNDARY_C, BOUNDARY_D, SPAN_NS, SPAN_WE
+from unionfind import ArrayDisjointSet
+
+
+
+def losuj(frames: np.ndarray, rng: np.random.Generator, s: Settings) -> np.ndarray:
+    '''
+    Draws new defects and counts down healing cells on the whole grid at once.
+    Vectorized counterpart of Symulacja2D.losuj
+
+    Parameters:
+    ----------
+    frames: np.ndarray
+        grid (H+2, W+2) or stack of grids (..., H+2, W+2), modified in place
+    rng: np.random.Generator
+        source of random numbers
+    s: Settings
+        simulation settings
+
+    Returns:
+    -------
+    np.ndarray
+        boolean mask (..., H, W) of drawn cells (markers of Symulacja2D)
+    '''
+
+    inner = frames[..., 1:-1, 1:-1]
+    draws = rng.random(inner.shape)
+
+    markers = ((inner == s.P1) & (draws < s.P1_PROBABILITY)) | \
+              ((inner == s.P2) & (draws < s.P2_PROBABILITY))
+
+    healing = (inner > s.DEFECT) & (inner < s.PERMANENT)
+    inner[healing] -= 1
+
+    return markers
+
+
+
+def new_cell_state(frames: np.ndarray, markers: np.ndarray, s: Settings) -> np.ndarray:
+    '''
+    Applies deterministic transitions to the whole grid at once.
+    Vectorized counterpart of Symulacja2D.new_cell_state, it reproduces
+    the row-by-row order of the original: upper and left neighbours
+    are read in the new state, lower and right ones in the old state.
+
+    Parameters:
+    ----------
+    frames: np.ndarray
+        grid (H+2, W+2) or stack of grids (..., H+2, W+2), modified in place
+    markers: np.ndarray
+        mask returned by losuj()
+    s: Settings
+        simulation settings
+
+    Returns:
+    -------
+    np.ndarray
+        boolean mask (..., H, W) of cells that became PERMANENT in this step
+    '''
+
+    old  = frames.copy()
+    prev = old[..., 1:-1, 1:-1]
+    new  = frames[..., 1:-1, 1:-1]
+
+    # nerby_defect: wylosowane komórki ważą tyle co DEFECT, a D (DEFECT) nic
+    weights = np.where(old == s.DEFECT, 0, old)
+    weights[..., 1:-1, 1:-1][markers] = s.DEFECT
+    pressure = weights[..., :-2, 1:-1] + weights[..., 2:, 1:-1] + \
+               weights[..., 1:-1, :-2] + weights[..., 1:-1, 2:]
+    nearby = pressure > s.DEFECT
+
+    healing  = (prev > s.DEFECT) & (prev < s.PERMANENT)
+    defect   = prev == s.DEFECT
+    p1       = (prev == s.P1) & ~markers
+    p2       = (prev == s.P2) & ~markers
+    promoted = (markers | healing) & nearby
+
+    new[markers]       = s.DEFECT + s.HEAL_CYKLES
+    new[promoted]      = s.PERMANENT
+    new[p1 & nearby]   = s.P2
+    new[p2 & ~nearby]  = s.P1
+    new[defect]        = s.P1
+
+    # D wraca do P2 jeżeli sąsiaduje z defektem
+    defect_nearby = (frames[..., :-2, 1:-1] >= s.DEFECT) | (frames[..., 1:-1, :-2] >= s.DEFECT) | \
+                    (old[..., 2:, 1:-1] >= s.DEFECT)     | (old[..., 1:-1, 2:] >= s.DEFECT)
+    new[defect & defect_nearby] = s.P2
+
+    # nowy defekt zamienia P1 z lewej i z góry na P2
+    spread = np.zeros_like(markers)
+    spread[..., :, :-1] = markers[..., :, 1:]
+    spread[..., :-1, :] |= markers[..., 1:, :]
+    new[spread & (new == s.P1)] = s.P2
+
+    return promoted
+
+
+
+def shown_state(cells: np.ndarray, s: Settings) -> np.ndarray:
+    '''
+    Maps raw cell values to states reported in the changed list
+    (healing cells are reported as DEFECT)
+    '''
+
+    return np.where((cells >= s.DEFECT) & (cells < s.PERMANENT), s.DEFECT, cells)
+
+
+
+class Symulacja2DNumpy(Symulacja2D):
+    '''
+    Simulation engine that keeps the frame as a NumPy array and performs
+    draws, neighbour tests, heal countdowns and P1/P2 relaxation as whole
+    array operations. Exposes the same interface as Symulacja2D.
+
+    Counters are computed from the frame after every step.
+    '''
+
+    def __init__(self, settings: Settings, seed: int = None) -> None:
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+        self._frame: np.ndarray = None
+
+        super().__init__(settings)
+
+
+    def __str__(self):
+        s1 = '\n'.join([''.join(['{:6}'.format(item) for item in row]) for row in self._frame.tolist()])
+
+        return '\n' + s1 + '\n'
+
+
+    def make_world(self):
+        s = self.settings
+
+        self._frame = np.full((self._height + 2, self._width + 2), s.EDGE, dtype=np.int32)
+        self._frame[1:-1, 1:-1] = s.P1
+
+
+    def _make_buffers(self) -> None:
+        # bufory, ciśnienie i koło czasowe silnika komórka po komórce nie są
+        # tu potrzebne, cały stan siatki jest w _frame
+        pass
+
+
+    def _connect(self, promoted: np.ndarray) -> None:
+        '''
+        Adds cells that became PERMANENT to the disjoint sets and joins
+        them with neighbouring PERMANENT and EDGE cells
+        '''
+
+        s = self.settings
+        frame = self._frame
+        encode = self._encode_id
+
+        union_find = self._disjoint_set
+
+        ys, xs = np.nonzero(promoted)
+        cells = [(y + 1, x + 1) for y, x in zip(ys.tolist(), xs.tolist())]
+
+        for y, x in cells:
+            union_find.makeset(encode(y, x))
+
+        xs, ys, boundaries = [], [], []
+        for y, x in cells:
+            enc = encode(y, x)
+            for b, a in self.neighbors(y, x):
+                n = frame[b, a]
+                if n == s.PERMANENT:
+                    xs.append(enc)
+                    ys.append(encode(b, a))
+                elif n == s.EDGE:
+                    boundaries.append((enc, self._boundary(b, a)))
+
+        union_find.union_many(xs, ys)
+
+        for enc, boundary in boundaries:
+            union_find.flag(enc, boundary)
+
+        for y, x in cells:
+            self._spanning(union_find.flags(encode(y, x)))
+
+
+    def _count(self) -> None:
+        s = self.settings
+        inner = self._frame[1:-1, 1:-1]
+
+        self._P1_counter = int(np.count_nonzero(inner == s.P1))
+        self._P2_counter = int(np.count_nonzero(inner == s.P2))
+        self._PD_counter = int(np.count_nonzero(inner == s.PERMANENT))
+        self._D_counter  = int(np.count_nonzero((inner >= s.DEFECT) & (inner < s.PERMANENT)))
+
+
+    def next_step(self):
+        s = self.settings
+        before = shown_state(self._frame[1:-1, 1:-1], s)
+
+        markers  = losuj(self._frame, self._rng, s)
+        promoted = new_cell_state(self._frame, markers, s)
+
+        self._connect(promoted)
+        self._count()
+        self.cykles_counter += 1
+
+        after = shown_state(self._frame[1:-1, 1:-1], s)
+        ys, xs = np.nonzero(after != before)
+
+        return list(zip(ys.tolist(), xs.tolist(), after[ys, xs].tolist()))
+
+
+
+class Ensemble2D:
+    '''
+    Advances many independent replicas of the simulation in one
+    (R, H+2, W+2) array with a single set of vectorized operations.
+    Replicas that percolate (or reach SIMULATION_CYKLES) are removed
+    from the array and their results are stored.
+
+    Fields:
+    ----------
+    _frames: np.ndarray
+        frames of replicas that are still running
+
+    _replicas: np.ndarray
+        replica number of every row of _frames
+
+    _results: list[tuple]
+        per replica (P1, P2, D, PD, cykles, NS, WE), None while running
+
+    _disjoint_sets: list[ArrayDisjointSet]
+        PERMANENT cells of every replica, cell id is
+        Symulacja2D._encode_id(y, x), roots are flagged with BOUNDARY_*
+        bits of touched edges. Set is created when the replica gets its
+        first PERMANENT cell and dropped when the replica finishes
+    '''
+
+    def __init__(self, settings: Settings, replicas: int, seed: int = None) -> None:
+        s = settings
+        self.settings: Settings = settings
+        self._width, self._height = s.GRID_SIZE
+        self._rng: np.random.Generator = np.random.default_rng(seed)
+
+        self._frames = np.full((replicas, self._height + 2, self._width + 2), s.EDGE, dtype=np.int32)
+        self._frames[:, 1:-1, 1:-1] = s.P1
+
+        self._replicas: np.ndarray = np.arange(replicas)
+        self._results: list[tuple] = [None] * replicas
+        self.cykles_counter: int = 0
+
+        self._cells: int = (self._height + 2) * (self._width + 2)
+        self._disjoint_sets: list[ArrayDisjointSet] = [None] * replicas
+
+
+    @property
+    def running(self) -> int:
+        return len(self._replicas)
+
+
+    @property
+    def results(self) -> list[tuple]:
+        return self._results
+
+
+    def _connect(self, promoted: np.ndarray) -> dict[int, tuple[bool, bool]]:
+        '''
+        Adds cells that became PERMANENT to the disjoint sets and checks
+        percolation of replicas that got new PERMANENT cells
+
+        Returns:
+        -------
+        dict[int, tuple[bool, bool]]
+            row of _frames -> (NS, WE) for replicas that percolated
+        '''
+
+        s = self.settings
+        frames = self._frames
+        w, h = self._width, self._height
+        disjoint_sets = self._disjoint_sets
+
+        rows, ys, xs = np.nonzero(promoted)
+        cells = [(row, y + 1, x + 1) for row, y, x in zip(rows.tolist(), ys.tolist(), xs.tolist())]
+        replicas = self._replicas.tolist()
+
+        for row, y, x in cells:
+            replica = replicas[row]
+            if disjoint_sets[replica] is None:
+                disjoint_sets[replica] = ArrayDisjointSet(self._cells)
+            disjoint_sets[replica].makeset(y * (w + 2) + x)
+
+        for row, y, x in cells:
+            union_find = disjoint_sets[replicas[row]]
+            enc = y * (w + 2) + x
+
+            for b, a in Symulacja2D.neighbors(y, x):
+                n = frames[row, b, a]
+                if n == s.PERMANENT:
+                    union_find.union(enc, b * (w + 2) + a)
+
+                # krawędzie zaznaczamy bitem w korzeniu zbioru
+                elif n == s.EDGE:
+                    if b == 0:
+                        union_find.flag(enc, BOUNDARY_A)
+                    elif b == h + 1:
+                        union_find.flag(enc, BOUNDARY_C)
+                    elif a == w + 1:
+                        union_find.flag(enc, BOUNDARY_B)
+                    elif a == 0:
+                        union_find.flag(enc, BOUNDARY_D)
+
+        percolated = {}
+        for row, y, x in cells:
+            boundaries = disjoint_sets[replicas[row]].flags(y * (w + 2) + x)
+            testNS = boundaries & SPAN_NS == SPAN_NS
+            testWE = boundaries & SPAN_WE == SPAN_WE
+            if testNS or testWE:
+                ns, we = percolated.get(row, (False, False))
+                percolated[row] = (ns or testNS, we or testWE)
+
+        return percolated
+
+
+    def _finish(self, rows: list[int], directions: list[tuple]) -> None:
+        '''
+        Stores results of given rows and removes them from the array
+        '''
+
+        s = self.settings
+        inner = self._frames[rows, 1:-1, 1:-1]
+
+        P1 = np.count_nonzero(inner == s.P1, axis=(1, 2)).tolist()
+        P2 = np.count_nonzero(inner == s.P2, axis=(1, 2)).tolist()
+        PD = np.count_nonzero(inner == s.PERMANENT, axis=(1, 2)).tolist()
+        D  = np.count_nonzero((inner >= s.DEFECT) & (inner < s.PERMANENT), axis=(1, 2)).tolist()
+
+        for i, row in enumerate(rows):
+            NS, WE = directions[i]
+            replica = self._replicas[row]
+            self._results[replica] = (P1[i], P2[i], D[i], PD[i], self.cykles_counter, NS, WE)
+            self._disjoint_sets[replica] = None
+
+        keep = np.ones(len(self._replicas), dtype=bool)
+        keep[rows] = False
+        self._frames = self._frames[keep]
+        self._replicas = self._replicas[keep]
+
+
+    def next_step(self) -> None:
+        s = self.settings
+
+        markers  = losuj(self._frames, self._rng, s)
+        promoted = new_cell_state(self._frames, markers, s)
+        self.cykles_counter += 1
+
+        percolated = self._connect(promoted)
+
+        if s.SIMULATION_CYKLES > 0 and self.cykles_counter >= s.SIMULATION_CYKLES:
+            rows = list(range(self.running))
+            self._finish(rows, [percolated.get(row, (None, None)) for row in rows])
+
+        elif percolated:
+            rows = sorted(percolated)
+            self._finish(rows, [percolated[row] for row in rows])
+
+
+    def run(self) -> list[tuple]:
+        '''
+        Runs all replicas until each of them percolates or reaches
+        SIMULATION_CYKLES
+
+        Returns:
+        -------
+        list[tuple]
+            per replica (P1, P2, D, PD, cykles, NS, WE)
+        '''
+
+        while self.running:
+            self.next_step()
+
+        return self._results
@@ -0,0 +1,57 @@
+"""
+Two-sample statistics shared by the statistical tests of the simulation.
+"""
+
+import math
+import statistics
+
+
+# dopuszczalne odchylenie w odchyleniach standardowych, przy ustalonym
+# ziarnie test jest powtarzalny, a próg zostawia spory zapas
+Z_LIMIT = 4.0
+
+# współczynnik progu dwupróbkowego testu Kołmogorowa-Smirnowa dla alfa = 0.001
+KS_LIMIT = 1.95
+
+
+
+def mean_z(a: list[float], b: list[float]) -> float:
+    '''
+    Welch statistic of the difference of means of two samples
+    '''
+
+    error = math.sqrt(statistics.variance(a) / len(a) + statistics.variance(b) / len(b))
+    return (statistics.mean(a) - statistics.mean(b)) / error
+
+
+
+def proportion_z(hits_a: int, n_a: int, hits_b: int, n_b: int) -> float:
+    '''
+    Statistic of the difference of two proportions, pooled variance
+    '''
+
+    p = (hits_a + hits_b) / (n_a + n_b)
+    error = math.sqrt(p * (1 - p) * (1 / n_a + 1 / n_b))
+    return (hits_a / n_a - hits_b / n_b) / error
+
+
+
+def ks_statistic(a: list[float], b: list[float]) -> float:
+    '''
+    Two-sample Kolmogorov-Smirnov statistic scaled by sqrt(n m / (n + m))
+    '''
+
+    a, b = sorted(a), sorted(b)
+    n, m = len(a), len(b)
+    i = j = 0
+    distance = 0.0
+
+    while i < n and j < m:
+        value = min(a[i], b[j])
+        while i < n and a[i] == value:
+            i += 1
+        while j < m and b[j] == value:
+            j += 1
+        distance = max(distance, abs(i / n - j / m))
+
+    return distance * math.sqrt(n * m / (n + m))
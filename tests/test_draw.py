@@ -0,0 +1,154 @@
+"""
+Geometric skip-sampling of defects (DRAW_MODE = "geometric") must give
+the same distribution as the per-cell Bernoulli draw.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import math
+import pathlib
+import random
+import statistics
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from settings import *
+from settings import Settings
+import runner
+import symulacja
+
+
+# dopuszczalne odchylenie w odchyleniach standardowych, przy ustalonym
+# ziarnie test jest powtarzalny, a próg zostawia spory zapas
+Z_LIMIT = 4.0
+
+
+
+def make_settings(draw_mode: str, size: tuple[int, int], p1: float, p2: float) -> Settings:
+    s = Settings.from_defaults(make_settings_file=False)
+    s.GRID_SIZE = size
+    s.P1_PROBABILITY = p1
+    s.P2_PROBABILITY = p2
+    s.DRAW_MODE = draw_mode
+    s.SIMULATION_CYKLES = 0
+
+    return s
+
+
+
+def binomial_z(hits: int, n: int, p: float) -> float:
+    '''
+    Distance of hits from the mean of Binomial(n, p) in standard deviations
+    '''
+
+    return (hits - n * p) / math.sqrt(n * p * (1 - p))
+
+
+
+class TestGeometricDraw(unittest.TestCase):
+
+    def setUp(self) -> None:
+        random.seed(20240601)
+
+
+    def draw_counts(self, p: float, trials: int, p2_every: int = 0) -> tuple[list[int], int]:
+        '''
+        Draws P1 population of fresh worlds, every p2_every-th cell is
+        turned into P2 first
+
+        Returns:
+        -------
+        tuple
+            (hits of every trial, size of P1 population)
+        '''
+
+        s = make_settings(DRAW_GEOMETRIC, (40, 25), p, 0.0)
+        w, h = s.GRID_SIZE
+        counts = []
+
+        for _ in range(trials):
+            world = symulacja.Symulacja2D(s)
+            population = w * h
+
+            if p2_every:
+                for i in range(0, w * h, p2_every):
+                    y, x = divmod(i, w)
+                    world._set_cell(y + 1, x + 1, s.P2)
+                population -= len(range(0, w * h, p2_every))
+
+            hits = world._draw(0, p, s.P1, -1)
+
+            # trafione mogą być tylko komórki P1
+            if p2_every:
+                for i in hits:
+                    self.assertNotEqual(i % p2_every, 0)
+
+            counts.append(len(hits))
+
+        return counts, population
+
+
+    def check_binomial(self, counts: list[int], n: int, p: float) -> None:
+        trials = len(counts)
+
+        # suma trafień ~ Binomial(trials * n, p)
+        self.assertLess(abs(binomial_z(sum(counts), trials * n, p)), Z_LIMIT)
+
+        # wariancja liczby trafień w próbie ~ n p (1 - p), błąd standardowy
+        # wariancji z próby w przybliżeniu normalnym: var * sqrt(2 / (trials - 1))
+        expected = n * p * (1 - p)
+        error = expected * math.sqrt(2 / (trials - 1))
+        self.assertLess(abs(statistics.variance(counts) - expected) / error, Z_LIMIT)
+
+
+    def test_hits_match_binomial(self):
+        for p in (0.002, 0.05, 0.3):
+            counts, n = self.draw_counts(p, trials=300)
+            self.check_binomial(counts, n, p)
+
+
+    def test_hits_only_in_population(self):
+        counts, n = self.draw_counts(0.1, trials=300, p2_every=3)
+        self.check_binomial(counts, n, 0.1)
+
+
+    def test_hits_uniform_over_cells(self):
+        # trafienia w każdym wierszu ~ Binomial(trials * w, p), test chi-kwadrat
+        # przybliżony rozkładem normalnym: (chi2 - dof) / sqrt(2 dof)
+        p, trials = 0.05, 300
+        s = make_settings(DRAW_GEOMETRIC, (40, 25), p, 0.0)
+        w, h = s.GRID_SIZE
+        rows = [0] * h
+
+        for _ in range(trials):
+            for i in symulacja.Symulacja2D(s)._draw(0, p, s.P1, -1):
+                rows[i // w] += 1
+
+        expected = trials * w * p
+        chi2 = sum((r - expected) ** 2 / (expected * (1 - p)) for r in rows)
+        self.assertLess(abs(chi2 - h) / math.sqrt(2 * h), Z_LIMIT)
+
+
+    def test_runs_match_bernoulli(self):
+        # średnie Cykle i PD całych symulacji w obu trybach losowania
+        runs = 600
+        results = {}
+
+        for mode in (DRAW_BERNOULLI, DRAW_GEOMETRIC):
+            s = make_settings(mode, (10, 10), 0.05, 0.2)
+            results[mode] = [runner.run_without_visualisation(s) for _ in range(runs)]
+
+        for column in (3, 4): # PD, cykle
+            a = [r[column] for r in results[DRAW_BERNOULLI]]
+            b = [r[column] for r in results[DRAW_GEOMETRIC]]
+
+            error = math.sqrt(statistics.variance(a) / runs + statistics.variance(b) / runs)
+            self.assertLess(abs(statistics.mean(a) - statistics.mean(b)) / error, Z_LIMIT)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
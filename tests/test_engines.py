@@ -0,0 +1,105 @@
+"""
+NumPy engine (Symulacja2DNumpy) and ensemble engine (Ensemble2D) must
+give the same distribution of results as the Python engine.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import pathlib
+import random
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from settings import Settings
+import runner
+
+from sampling import Z_LIMIT, KS_LIMIT, mean_z, proportion_z, ks_statistic
+
+try:
+    from symulacja_numpy import Symulacja2DNumpy, Ensemble2D
+except ImportError:
+    Symulacja2DNumpy = Ensemble2D = None
+
+
+
+def make_settings(limit: int = 0) -> Settings:
+    s = Settings.from_defaults(make_settings_file=False)
+    s.GRID_SIZE = (10, 10)
+    s.P1_PROBABILITY = 0.002
+    s.P2_PROBABILITY = 0.02
+    s.SIMULATION_CYKLES = limit
+
+    return s
+
+
+
+def run_numpy(settings: Settings, seed: int) -> tuple:
+    '''
+    One run of Symulacja2DNumpy, result as from runner.run_without_visualisation()
+    '''
+
+    world = Symulacja2DNumpy(settings, seed)
+    limit = settings.SIMULATION_CYKLES
+
+    while not world.simulation_finished() and not (limit > 0 and world.cykles >= limit):
+        world.next_step()
+
+    ns, we = world.paths_direction or (None, None)
+    return (world.P1, world.P2, world.D, world.PD, world.cykles, ns, we)
+
+
+
+@unittest.skipIf(Symulacja2DNumpy is None, 'numpy is not installed')
+class TestEngines(unittest.TestCase):
+
+    RUNS = 400
+
+    def setUp(self) -> None:
+        random.seed(20240625)
+
+
+    def check_same(self, a: list[tuple], b: list[tuple]) -> None:
+        for column in (3, 4): # PD, cykle
+            x = [r[column] for r in a]
+            y = [r[column] for r in b]
+
+            self.assertLess(abs(mean_z(x, y)), Z_LIMIT)
+            self.assertLess(ks_statistic(x, y), KS_LIMIT)
+
+        # odsetek przebić siatki, przy limicie cykli nie każdy run się kończy przebiciem
+        hits = [sum(bool(r[5] or r[6]) for r in results) for results in (a, b)]
+        if 0 < sum(hits) < len(a) + len(b):
+            self.assertLess(abs(proportion_z(hits[0], len(a), hits[1], len(b))), Z_LIMIT)
+        else:
+            self.assertEqual(hits[0] == 0, hits[1] == 0)
+
+
+    def python_runs(self, settings: Settings) -> list[tuple]:
+        return [runner.run_without_visualisation(settings) for _ in range(self.RUNS)]
+
+
+    def test_numpy_matches_python(self):
+        s = make_settings()
+        numpy_runs = [run_numpy(s, seed) for seed in range(self.RUNS)]
+
+        self.check_same(self.python_runs(s), numpy_runs)
+
+
+    def test_ensemble_matches_python(self):
+        for limit in (0, 100):
+            s = make_settings(limit)
+            results = Ensemble2D(s, self.RUNS, seed=limit).run()
+
+            self.check_same(self.python_runs(s), results)
+            for r in results:
+                self.assertEqual(sum(r[:4]), 100)
+                if limit:
+                    self.assertLessEqual(r[4], limit)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Event-driven fast-forward (EVENT_DRIVEN) skips quiescent cycles by
+sampling the next draw hit, runs must keep the distribution of the
+step-by-step simulation.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import pathlib
+import random
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from settings import Settings
+import runner
+
+from sampling import Z_LIMIT, KS_LIMIT, mean_z, proportion_z, ks_statistic
+
+
+
+def make_settings(event_driven: bool, limit: int) -> Settings:
+    s = Settings.from_defaults(make_settings_file=False)
+    s.GRID_SIZE = (10, 10)
+    s.P1_PROBABILITY = 0.002
+    s.P2_PROBABILITY = 0.02
+    s.EVENT_DRIVEN = event_driven
+    s.SIMULATION_CYKLES = limit
+
+    return s
+
+
+
+class TestEventDriven(unittest.TestCase):
+
+    RUNS = 500
+
+    def setUp(self) -> None:
+        random.seed(20240615)
+
+
+    def runs(self, limit: int) -> dict[bool, list[tuple]]:
+        '''
+        Results of RUNS simulations with and without EVENT_DRIVEN
+        '''
+
+        return {event_driven: [runner.run_without_visualisation(make_settings(event_driven, limit))
+                               for _ in range(self.RUNS)]
+                for event_driven in (False, True)}
+
+
+    def check_same(self, results: dict[bool, list[tuple]]) -> None:
+        for column in (3, 4): # PD, cykle
+            a = [r[column] for r in results[False]]
+            b = [r[column] for r in results[True]]
+
+            self.assertLess(abs(mean_z(a, b)), Z_LIMIT)
+            self.assertLess(ks_statistic(a, b), KS_LIMIT)
+
+
+    def test_runs_match_step_by_step(self):
+        self.check_same(self.runs(limit=0))
+
+
+    def test_runs_match_with_cykles_limit(self):
+        limit = 100
+        results = self.runs(limit)
+        self.check_same(results)
+
+        # przeskok nie może wyjść poza limit cykli
+        for r in results[True]:
+            self.assertLessEqual(r[4], limit)
+
+        # odsetek przebić siatki przed limitem ~ ten sam w obu trybach
+        hits = [sum(bool(r[5] or r[6]) for r in results[mode]) for mode in (False, True)]
+        self.assertLess(abs(proportion_z(hits[0], self.RUNS, hits[1], self.RUNS)), Z_LIMIT)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
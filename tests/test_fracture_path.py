@@ -0,0 +1,160 @@
+"""
+Bidirectional BFS (Symulacja2D._bfs_path) must return a connected,
+shortest path from sources to targets, also for fracture paths of
+finished simulations.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import collections
+import pathlib
+import random
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from settings import Settings
+import symulacja
+
+
+
+def make_world(size: tuple[int, int], p1: float = 0.05) -> symulacja.Symulacja2D:
+    s = Settings.from_defaults(make_settings_file=False)
+    s.GRID_SIZE = size
+    s.P1_PROBABILITY = p1
+    s.P2_PROBABILITY = 0.3
+    s.SIMULATION_CYKLES = 0
+
+    return symulacja.Symulacja2D(s)
+
+
+
+def shortest_length(cells: list[int], sources: list[int], targets: list[int], step: int) -> int:
+    '''
+    Number of cells on the shortest path found by plain BFS, 0 if there is no path
+    '''
+
+    inside = set(cells)
+    targets = set(targets)
+    distance = {cell: 1 for cell in sources}
+    queue = collections.deque(sources)
+
+    while queue:
+        cell = queue.popleft()
+        if cell in targets:
+            return distance[cell]
+
+        for n in (cell - step, cell + step, cell - 1, cell + 1):
+            if n in inside and n not in distance:
+                distance[n] = distance[cell] + 1
+                queue.append(n)
+
+    return 0
+
+
+
+class TestBfsPath(unittest.TestCase):
+
+    def setUp(self) -> None:
+        random.seed(20240620)
+
+
+    def check_path(self, path: list[int], cells: list[int], sources: list[int], targets: list[int], step: int) -> None:
+        self.assertEqual(len(path), shortest_length(cells, sources, targets, step))
+        if not path:
+            return
+
+        self.assertIn(path[0], sources)
+        self.assertIn(path[-1], targets)
+        self.assertTrue(set(path) <= set(cells))
+        self.assertEqual(len(set(path)), len(path))
+
+        # kolejne komórki są sąsiadami (von Neumann)
+        for a, b in zip(path, path[1:]):
+            self.assertIn(abs(a - b), (1, step))
+
+
+    def test_random_cells(self):
+        w, h = 9, 7
+        world = make_world((w, h))
+        step = w + 2
+        found = 0
+
+        for density in (0.45, 0.6, 0.8, 1.0):
+            for _ in range(50):
+                cells = [y * step + x for y in range(1, h + 1) for x in range(1, w + 1)
+                         if random.random() < density]
+                sources = [cell for cell in cells if cell // step == h]
+                targets = [cell for cell in cells if cell // step == 1]
+
+                path = world._bfs_path(cells, sources, targets)
+                self.check_path(path, cells, sources, targets, step)
+                found += bool(path)
+
+        # losowe zbiory dają zarówno przypadki ze ścieżką, jak i bez niej
+        self.assertGreater(found, 0)
+        self.assertLess(found, 200)
+
+
+    def test_buffers_are_cleaned(self):
+        w, h = 6, 5
+        world = make_world((w, h))
+        step = w + 2
+
+        # pełny prostokąt: najkrótsza ścieżka to prosta kolumna
+        cells = [y * step + x for y in range(1, h + 1) for x in range(1, w + 1)]
+        for x in range(1, w + 1):
+            path = world._bfs_path(cells, [h * step + x], [step + x])
+            self.assertEqual(path, [y * step + x for y in range(h, 0, -1)])
+
+        self.assertEqual(set(world._bfs_inside), {0})
+        self.assertEqual(set(world._bfs_prev), {-1})
+        self.assertEqual(set(world._bfs_succ), {-1})
+
+
+    def test_source_is_target(self):
+        world = make_world((4, 1))
+        cells = [5, 6, 7, 8]
+
+        self.assertEqual(world._bfs_path(cells, cells, cells), [5])
+
+
+    def test_fracture_path_spans_grid(self):
+        w, h = 12, 10
+        symulacja.random.seed(20240620)
+
+        for _ in range(20):
+            world = make_world((w, h))
+            while not world.simulation_finished():
+                world.next_step()
+
+            path = [(y, x) for y, x, state in world.get_fracture_path() if state == world.settings.FRACTURE_PATH]
+            ns, we = world.paths_direction
+            if world._path_starting_point == world._supercells[0]:
+                self.assertTrue(ns)
+                self.assertEqual((path[0][0], path[-1][0]), (h - 1, 0))
+            else:
+                self.assertTrue(we)
+                self.assertEqual((path[0][1], path[-1][1]), (0, w - 1))
+
+            # ścieżka to sąsiednie PERMANENT komórki, najkrótsza w przebitym zbiorze
+            for (y1, x1), (y2, x2) in zip(path, path[1:]):
+                self.assertEqual(abs(y1 - y2) + abs(x1 - x2), 1)
+
+            step = w + 2
+            bits = symulacja.SPAN_NS if world._path_starting_point == world._supercells[0] else symulacja.SPAN_WE
+            cells = world._disjoint_set.return_flagged_list(bits)
+            if bits == symulacja.SPAN_NS:
+                sources = [c for c in cells if c // step == h]
+                targets = [c for c in cells if c // step == 1]
+            else:
+                sources = [c for c in cells if c % step == 1]
+                targets = [c for c in cells if c % step == w]
+            self.assertEqual(len(path), shortest_length(cells, sources, targets, step))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
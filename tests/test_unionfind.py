@@ -0,0 +1,299 @@
+"""
+DisjointSet and ArrayDisjointSet against a naive partition of elements,
+plus array-specific behaviour: union by size, path halving, flags of
+sets and per-replica sets of Ensemble2D.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import pathlib
+import random
+import sys
+import unittest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from settings import Settings
+from unionfind import DisjointSet, ArrayDisjointSet
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+
+class Partition:
+    '''
+    Reference model, every element keeps the frozenset of its set
+    '''
+
+    def __init__(self, members: set[int]) -> None:
+        self.sets = {x: frozenset([x]) for x in members}
+
+
+    def union(self, x: int, y: int) -> None:
+        if x in self.sets and y in self.sets:
+            merged = self.sets[x] | self.sets[y]
+            for member in merged:
+                self.sets[member] = merged
+
+
+    def groups(self) -> list[list[int]]:
+        return sorted(sorted(group) for group in set(self.sets.values()))
+
+
+
+def random_ops(seed: int, n: int = 200) -> tuple[set[int], list[tuple[int, int]]]:
+    '''
+    Random members of [0, n) and random pairs to join, some of them
+    with elements that are not members
+    '''
+
+    r = random.Random(seed)
+    members = set(r.sample(range(n), 3 * n // 4))
+    pairs = [(r.randrange(n), r.randrange(n)) for _ in range(n // 2)]
+
+    return members, pairs
+
+
+
+def groups(sets: dict) -> list[list[int]]:
+    return sorted(sorted(group) for group in sets.values())
+
+
+
+class TestDisjointSet(unittest.TestCase):
+
+    def test_matches_partition(self):
+        for seed in range(20):
+            members, pairs = random_ops(seed)
+            d = DisjointSet()
+            model = Partition(members)
+
+            for x in members:
+                d.makeset(x)
+            for x, y in pairs:
+                d.union(x, y)
+                model.union(x, y)
+
+            self.assertEqual(groups(d.return_sets()), model.groups())
+            for x in members:
+                self.assertEqual(sorted(d.return_members_list(x)), sorted(model.sets[x]))
+                self.assertEqual(d.return_members_set(x), model.sets[x])
+
+
+    def test_union_of_non_member_is_ignored(self):
+        d = DisjointSet()
+        d.makeset(1)
+        d.union(1, 2)
+
+        self.assertNotIn(2, d)
+        self.assertEqual(d.return_members_list(1), [1])
+
+
+    def test_members_list_starts_at_given_element(self):
+        d = DisjointSet()
+        for x in range(5):
+            d.makeset(x)
+        for x in range(4):
+            d.union(x, x + 1)
+
+        for x in range(5):
+            members = d.return_members_list(x)
+            self.assertEqual(members[0], x)
+            self.assertEqual(sorted(members), list(range(5)))
+
+
+
+class TestArrayDisjointSet(unittest.TestCase):
+
+    def test_matches_partition(self):
+        for seed in range(20):
+            members, pairs = random_ops(seed)
+            a = ArrayDisjointSet(200)
+            model = Partition(members)
+
+            for x in members:
+                a.makeset(x)
+            for i, (x, y) in enumerate(pairs):
+                # union i union_many na przemian, wynik ma być ten sam
+                if i % 2:
+                    a.union(x, y)
+                else:
+                    a.union_many([x], [y])
+                model.union(x, y)
+
+            self.assertEqual(groups(a.return_sets()), model.groups())
+            self.assertEqual(a.trees, len(members))
+            for x in members:
+                self.assertIn(x, a)
+                self.assertEqual(sorted(a.return_members_list(x)), sorted(model.sets[x]))
+                for y in model.sets[x]:
+                    self.assertTrue(a.connected(x, y))
+
+
+    def test_union_many_accepts_arrays(self):
+        if numpy is None:
+            self.skipTest('numpy is not installed')
+
+        a = ArrayDisjointSet(10)
+        for x in range(10):
+            a.makeset(x)
+        a.union_many(numpy.arange(0, 8, 2), numpy.arange(1, 9, 2))
+
+        self.assertEqual(groups(a.return_sets()), [[0, 1], [2, 3], [4, 5], [6, 7], [8], [9]])
+
+
+    def test_union_of_non_member_is_ignored(self):
+        a = ArrayDisjointSet(4)
+        a.makeset(0)
+
+        self.assertEqual(a.union(0, 1), -1)
+        a.union_many([0], [2])
+
+        self.assertNotIn(1, a)
+        self.assertNotIn(2, a)
+        self.assertEqual(a.return_members_list(0), [0])
+
+
+    def test_union_by_size(self):
+        a = ArrayDisjointSet(10)
+        for x in range(10):
+            a.makeset(x)
+        for x in range(1, 5):
+            a.union(0, x)
+        big = a.find(0)
+
+        # mniejszy zbiór zostaje poddrzewem większego, niezależnie od kolejności
+        self.assertEqual(a.union(9, 0), big)
+        a.union(7, 8)
+        self.assertEqual(a.union(7, 4), big)
+        self.assertEqual(a.find(8), big)
+
+
+    def test_path_halving(self):
+        n = 9
+        a = ArrayDisjointSet(n)
+        for x in range(n):
+            a.makeset(x)
+
+        # łańcuch 8 -> 7 -> ... -> 0 ułożony ręcznie, union by size go nie zbuduje
+        parent = a._ArrayDisjointSet__parent
+        for x in range(1, n):
+            parent[x] = x - 1
+
+        self.assertEqual(a.find(n - 1), 0)
+
+        # co drugi węzeł ścieżki wskazuje teraz na dziadka
+        self.assertEqual(list(parent), [0, 0, 0, 2, 2, 4, 4, 6, 6])
+        self.assertEqual(a.find(n - 1), 0)
+
+
+    def test_flags_are_ored(self):
+        a = ArrayDisjointSet(6)
+        for x in range(6):
+            a.makeset(x)
+
+        self.assertEqual(a.flag(0, 0b0001), 0b0001)
+        self.assertEqual(a.flag(1, 0b0010), 0b0010)
+        self.assertEqual(a.flag(1, 0b0100), 0b0110)
+        a.union(0, 1)
+        self.assertEqual(a.flags(0), 0b0111)
+        self.assertEqual(a.flags(1), 0b0111)
+
+        a.union_many([2], [3])
+        a.flag(3, 0b1000)
+        a.union_many([3], [0])
+        self.assertEqual(a.flags(2), 0b1111)
+        self.assertEqual(a.flags(4), 0)
+
+
+    def test_return_flagged_list(self):
+        for seed in range(20):
+            r = random.Random(seed)
+            members, pairs = random_ops(seed)
+            a = ArrayDisjointSet(200)
+            model = Partition(members)
+            flags = {x: 0 for x in members}
+
+            for x in members:
+                a.makeset(x)
+
+            # flagi ustawiane przed łączeniem zbiorów i w jego trakcie
+            flagged = iter(r.sample(sorted(members), 40))
+            for i, (x, y) in enumerate(pairs):
+                if i % 5 == 0:
+                    z = next(flagged)
+                    bits = 1 << r.randrange(4)
+                    a.flag(z, bits)
+                    flags[z] |= bits
+
+                if r.random() < .5:
+                    a.union(x, y)
+                else:
+                    a.union_many([x], [y])
+                model.union(x, y)
+
+            for bits in (0b0001, 0b0010, 0b0101, 0b1111):
+                expected = sorted(x for x in members
+                                  if any(flags[y] & bits for y in model.sets[x]))
+                self.assertEqual(sorted(a.return_flagged_list(bits)), expected)
+
+
+    def test_members_list_starts_at_given_element(self):
+        a = ArrayDisjointSet(5)
+        for x in range(5):
+            a.makeset(x)
+        for x in range(4):
+            a.union(x, x + 1)
+
+        for x in range(5):
+            members = a.return_members_list(x)
+            self.assertEqual(members[0], x)
+            self.assertEqual(sorted(members), list(range(5)))
+
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestEnsembleDisjointSets(unittest.TestCase):
+
+    def test_sets_are_per_replica(self):
+        from symulacja_numpy import Ensemble2D
+
+        s = Settings.from_defaults(make_settings_file=False)
+        s.GRID_SIZE = (8, 6)
+        s.P1_PROBABILITY = 0.03
+        s.P2_PROBABILITY = 0.2
+        ensemble = Ensemble2D(s, 12, seed=7)
+        w, h = s.GRID_SIZE
+
+        # zbiory tworzone dopiero przy pierwszej PERMANENT komórce repliki
+        self.assertEqual(ensemble._disjoint_sets, [None] * 12)
+
+        while ensemble.running:
+            ensemble.next_step()
+
+            for row, replica in enumerate(ensemble._replicas.tolist()):
+                union_find = ensemble._disjoint_sets[replica]
+                frame = ensemble._frames[row]
+                permanent = {y * (w + 2) + x for y in range(1, h + 1) for x in range(1, w + 1)
+                             if frame[y, x] == s.PERMANENT}
+
+                if union_find is None:
+                    self.assertEqual(permanent, set())
+                    continue
+
+                # w zbiorze repliki są dokładnie jej PERMANENT komórki
+                members = {x for group in union_find.return_sets().values() for x in group}
+                self.assertEqual(members, permanent)
+
+        # skończone repliki nie trzymają już swoich zbiorów
+        self.assertEqual(ensemble._disjoint_sets, [None] * 12)
+        self.assertNotIn(None, ensemble.results)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,35 @@
 import math
+import queue
+import threading
+import numpy as np
 import pygame
+import pygame.surfarray
 from settings import *
 
 
+#powyżej tej liczby zmienionych kafelków ekran odświeżany jest jednym
+#prostokątem obejmującym wszystkie zmiany
+MAX_DIRTY_RECTS = 64
+
+#przybliżone koszty w pikselach, według nich wybierany jest tańszy sposób:
+#przeliczenie prostokąta obrazu (paleta, skalowanie, linie, blit) kosztuje
+#RENDER_COST na piksel, a każda operacja na pojedynczym kafelku (fill, blit)
+#dodatkowo TILE_OP_COST niezależnie od jego rozmiaru
+RENDER_COST  = 4
+TILE_OP_COST = 1000
+
+
 class Grid:
     """
     Creates a surface and paints a grid on it. Also update the grid
     according to the list of changes.
 
+    State of the grid is kept as a small image of palette indices, one
+    pixel per cell. A few changed tiles are filled directly, more of them
+    are written to the image at once and only the box around them is
+    mapped to colours through the palette, scaled to tile size in one
+    call and covered with pre-rendered grid lines.
+
 
     Attributes:
     ==========
@@ -22,21 +44,53 @@ class Grid:
         on screen margins of grid (px)
     _grid_size_in_pixels: tuple(int,int)
         size of grid in pixel
+    _states: np.ndarray
+        sorted cell states that have a colour
+    _indices: np.ndarray
+        palette index of each state from _states
+    _palette: np.ndarray
+        colours (RGB) of palette indices
+    _state_index: dict[int, int]
+        palette index of a state, for changes handled one by one
+    _colors: list[tuple[int,int,int]]
+        colours of palette indices as tuples, for Surface.fill()
+    _image: np.ndarray
+        palette index of every cell, indexed [x, y] like pygame.surfarray
+    _cells: pygame.Surface
+        one pixel per cell image of the grid
+    _scaled: pygame.Surface
+        _cells scaled to tile size
+    _lines: pygame.Surface
+        grid lines between tiles, the rest is transparent (colorkey)
+    _area: pygame.Rect
+        part of the surface covered by tiles
+    _tile: tuple(int,int)
+        size of tile with grid line (px)
+    _clean: pygame.Surface
+        copy of the surface with all tiles in P1 state
+    _clean_image: np.ndarray
+        _image with all tiles in P1 state
 
     Methods:
     =======
     _make_grid(self)
         calculating grid parameters, and in-memory grid representation
+    _make_palette(self)
+        builds state to colour lookup table
+    _render(self, box)
+        paints tiles from _image in the box (all by default) on the surface
     get_surface(self)
         returns canvas
+    reset(self)
+        brings back the grid with all tiles in P1 state
     update(cells, surface)
         updates grid in memory and on screen, according to information
-        from cells
+        from cells, returns changed rects of the screen
 
     
     Imports:
     =======
-    pygame
+    pygame, numpy
     """
 
 
@@ -57,7 +111,37 @@ class Grid:
         self._grid_size_in_pixels :tuple[int, int]         = settings.GRID_SIZE_PIXELS
 
         self._surface.fill(self.settings.BACKGROUND_COLOR)
+        self._make_palette()
         self._make_grid()
+        self._render()
+
+        self._clean       = self._surface.copy()
+        self._clean_image = self._image.copy()
+
+
+
+    def _make_palette(self) -> None:
+        """
+        Lookup table from cell state to colour, states are kept sorted
+        so a whole list of changes is mapped with one np.searchsorted
+        """
+
+        s = self.settings
+        colors = {
+            s.P1:               s.P1_COLOR,
+            s.P2:               s.P2_COLOR,
+            s.DEFECT:           s.D_COLOR,
+            s.PERMANENT:        s.PD_COLOR,
+            s.DESTRUCTION_PATH: s.DP_COLOR,
+            s.FRACTURE_PATH:    s.FP_COLOR
+        }
+
+        states = sorted(colors)
+        self._states  = np.array(states, dtype=np.int64)
+        self._indices = np.arange(len(states), dtype=np.uint8)
+        self._palette = np.array([colors[state] for state in states], dtype=np.uint8)
+        self._state_index = {state: index for index, state in enumerate(states)}
+        self._colors = [colors[state] for state in states]
 
 
     def _make_grid(self) -> None:
@@ -88,20 +172,83 @@ class Grid:
                                    tile_y - 1)
 
                 line.append(rect)
-                pygame.draw.rect(self._surface, color=self.settings.P1_COLOR, rect=rect)
    
             self._grid.append(line)
 
+        #na początku wszystkie komórki są w stanie P1
+        self._image  = np.full((x, y), self._indices[self._states == self.settings.P1][0], dtype=np.uint8)
+        self._cells  = pygame.Surface((x, y))
+        self._area   = pygame.Rect(margin_x, margin_y, x * tile_x, y * tile_y)
+        self._tile   = (tile_x, tile_y)
+        self._scaled = pygame.Surface(self._area.size)
+
+        #linie siatki w kolorze tła (ostatni piksel każdego kafelka),
+        #reszta przezroczysta, kolor przezroczysty różni się od koloru tła
+        background = self.settings.BACKGROUND_COLOR
+        colorkey   = tuple(255 - c for c in background)
+        self._lines = pygame.Surface(self._area.size)
+        self._lines.fill(colorkey)
+        self._lines.set_colorkey(colorkey)
+
+        for i in range(x):
+            pygame.draw.line(self._lines, background, ((i + 1) * tile_x - 1, 0), ((i + 1) * tile_x - 1, self._area.height - 1))
+        for j in range(y):
+            pygame.draw.line(self._lines, background, (0, (j + 1) * tile_y - 1), (self._area.width - 1, (j + 1) * tile_y - 1))
+
+
+
+    def _render(self, box: tuple[int, int, int, int] = None) -> pygame.Rect:
+        """
+        Paints tiles: indices -> colours -> one pixel per cell surface,
+        scaled to tiles and covered with grid lines
+
+        Parameters:
+        ==========
+        box: tuple[int,int,int,int]
+            (x0, y0, x1, y1) range of cells, x1 and y1 excluded,
+            all cells by default
+
+        Returns:
+        -------
+        pygame.Rect
+            painted part of the surface
+        """
+
+        x0, y0, x1, y1 = box if box else (0, 0, *self._grid_size)
+        tile_x, tile_y = self._tile
+
+        cells  = pygame.Rect(x0, y0, x1 - x0, y1 - y0)
+        pixels = pygame.Rect(x0 * tile_x, y0 * tile_y, cells.width * tile_x, cells.height * tile_y)
+
+        pygame.surfarray.blit_array(self._cells.subsurface(cells), self._palette[self._image[x0:x1, y0:y1]])
+        scaled = self._scaled.subsurface(pixels)
+        pygame.transform.scale(self._cells.subsurface(cells), pixels.size, scaled)
+        scaled.blit(self._lines, (0, 0), area=pixels)
+
+        return self._surface.blit(scaled, pixels.move(self._area.topleft))
+
 
 
     def get_surface(self) -> pygame.Surface:
         return self._surface
 
 
+
+    def reset(self) -> None:
+        """
+        Brings back the grid from before the first update, so the same
+        Grid can be used for the next run
+        """
+
+        self._image[...] = self._clean_image
+        self._surface.blit(self._clean, (0, 0))
+
+
     
-    def update(self, cells:list[tuple[int,int,int]], surface: pygame.Surface) -> None:
+    def update(self, cells:list[tuple[int,int,int]], surface: pygame.Surface) -> list[pygame.Rect]:
         """
-        Updates grid with information from changed tiles list
+        Updates grid with information from changed tiles list, only
+        changed tiles are blitted to the surface
 
         Parameters:
         ==========
@@ -114,30 +261,200 @@ class Grid:
             a surface on which tiles will be drawn 
             TODO: why this is not a constructor parameter
                   available through self?
+
+        Returns:
+        -------
+        list[pygame.Rect]
+            rects of the surface that changed, for pygame.display.update(),
+            empty if nothing changed
+        """
+
+        if not len(cells):
+            return []
+
+        if len(cells) <= MAX_DIRTY_RECTS:
+            #kilka kafelków: wypełniane bezpośrednio, bez przeliczania obrazu
+            dirty = []
+            for y, x, state in cells:
+                index = self._state_index.get(state)
+                if index is None: #stany bez koloru są pomijane
+                    continue
+
+                self._image[x, y] = index
+                rect = self._grid[y][x]
+                self._surface.fill(self._colors[index], rect)
+                dirty.append(rect)
+
+        else:
+            ys, xs, states = np.array(cells, dtype=np.int64).reshape(-1, 3).T
+
+            #stany bez koloru są pomijane
+            found = np.searchsorted(self._states, states).clip(0, len(self._states) - 1)
+            known = self._states[found] == states
+            ys, xs = ys[known], xs[known]
+
+            if not len(xs):
+                return []
+
+            indices = self._indices[found[known]]
+            self._image[xs, ys] = indices
+
+            box = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+            tile_x, tile_y = self._tile
+            box_pixels = (box[2] - box[0]) * (box[3] - box[1]) * tile_x * tile_y
+
+            if len(xs) * (tile_x * tile_y + TILE_OP_COST) <= box_pixels * RENDER_COST:
+                #zmiany rozproszone: wypełnienie kafelków jest tańsze niż przeliczenie prostokąta
+                grid, colors = self._grid, self._colors
+                dirty = []
+                for y, x, index in zip(ys.tolist(), xs.tolist(), indices.tolist()):
+                    rect = grid[y][x]
+                    self._surface.fill(colors[index], rect)
+                    dirty.append(rect)
+            else:
+                #przeliczany jest tylko prostokąt obejmujący zmiany
+                dirty = [self._render(box)]
+
+        if len(dirty) > MAX_DIRTY_RECTS:
+            union = dirty[0].unionall(dirty)
+
+            #gęste zmiany kopiowane są na ekran jednym prostokątem
+            tile_x, tile_y = self._tile
+            if len(dirty) * (tile_x * tile_y + TILE_OP_COST) > union.width * union.height:
+                dirty = [union]
+        else:
+            union = None
+
+        source = self._surface
+        surface.blits([(source, rect.move(self._surface_margins), rect) for rect in dirty], doreturn=False)
+
+        #dla wielu kafelków ekran odświeżany jest jednym prostokątem
+        if union:
+            return [union.move(self._surface_margins)]
+
+        return [rect.move(self._surface_margins) for rect in dirty]
+    
+
+
+
+class ScreenshotWriter:
+    """
+    Saves screenshots of visual runs in a background thread, so encoding
+    of the image does not hold back the next run. Queue is bounded, when
+    the thread falls behind save() waits for a free place. Error of
+    writing a file is raised by the next save() or by close().
+
+
+    Attributes:
+    ==========
+    _extension: str
+        file format, pygame chooses encoder by the extension
+    _every: int
+        only every _every-th screenshot is saved (0 = none)
+    _count: int
+        number of save() calls
+    _queue: queue.Queue
+        copies of surfaces waiting to be written, None ends the thread
+    _thread: threading.Thread
+        thread writing files
+    _error: Exception
+        first error of writing, None if all files were written
+
+    Methods:
+    =======
+    save(surface, name)
+        hands copy of the surface over to the writing thread
+    close()
+        waits until all screenshots are written
+    """
+
+
+    def __init__(self, extension: str = SCREENSHOT_PNG, every: int = 1, queue_size: int = 4) -> None:
+        self._extension :str              = extension
+        self._every     :int              = every
+        self._count     :int              = 0
+        self._queue     :queue.Queue      = queue.Queue(maxsize=queue_size)
+        self._thread    :threading.Thread = threading.Thread(target=self._write, daemon=True)
+        self._error     :Exception        = None
+
+        self._thread.start()
+
+
+
+    def _write(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            #po błędzie kolejka jest tylko opróżniana, żeby put() nigdy nie czekał
+            if self._error is not None:
+                continue
+
+            surface, filename = item
+            try:
+                pygame.image.save(surface, filename)
+            except Exception as e:
+                self._error = e
+
+
+
+    def _put(self, item: tuple) -> None:
+        '''
+        Puts item on the queue, waits for a free place only while the thread lives
+
+        Raises:
+        ------
+        Exception
+            error of writing one of previous files
+        RuntimeError
+            if the writing thread is not running
+        '''
+
+        while True:
+            if self._error is not None:
+                raise self._error
+
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    raise RuntimeError('screenshot writer thread is not running')
+
+
+
+    def save(self, surface: pygame.Surface, name: str) -> None:
+        """
+        Parameters:
+        ==========
+        surface: pygame.Surface
+            surface to save, it is copied so it can be drawn on right away
+        name: str
+            file name without extension
         """
 
-        for y, x, state in cells:
+        self._count += 1
+        if self._every <= 0 or (self._count - 1) % self._every:
+            return
 
-            if state == self.settings.P1:
-                    color = self.settings.P1_COLOR
+        self._put((surface.copy(), name + '.' + self._extension))
 
-            elif state == self.settings.P2:
-                    color = self.settings.P2_COLOR
-                
-            elif state == self.settings.DEFECT:
-                    color =  self.settings.D_COLOR
 
-            elif state == self.settings.PERMANENT:
-                    color = self.settings.PD_COLOR
 
-            elif state ==self.settings.DESTRUCTION_PATH:
-                    color = self.settings.DP_COLOR
+    def close(self) -> None:
+        '''
+        Waits until all screenshots are written
 
-            elif state == self.settings.FRACTURE_PATH:
-                    color = self.settings.FP_COLOR
+        Raises:
+        ------
+        Exception
+            error of writing one of the files
+        '''
 
-            rect = self._grid[y][x]
-            pygame.draw.rect(self._surface, color, rect = rect)
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
 
-        surface.blit(self._surface, self._surface_margins)
-    
\ No newline at end of file
+        if self._error is not None:
+            raise self._error
@@ -1,5 +1,6 @@
 
-from typing import Any, Hashable
+from array import array
+from typing import Any, Hashable, Iterable
 from settings import *
 
 
@@ -18,6 +19,9 @@ class DisjointSet:
             contains representants from all sets
         __rank : dict
             contains ranks of all sets roots
+        __next : dict
+            next member of the same set, members of every set
+            form a circular list
 
         Properties
         ----------
@@ -45,6 +49,7 @@ class DisjointSet:
     def __init__(self) -> None:
         self.__parent: dict[Hashable, int] = {}
         self.__rank: dict[Hashable, int] = {}
+        self.__next: dict[Hashable, Hashable] = {}
         
 
 
@@ -107,6 +112,7 @@ class DisjointSet:
         if x not in self.__parent:
             self.__parent[x] = x
             self.__rank[x]  = 0
+            self.__next[x]  = x
 
 
 
@@ -171,12 +177,19 @@ class DisjointSet:
                     self.__parent[rootx] = y
                     self.__rank[rooty] += 1
 
+                # sklej listy cykliczne obu zbiorów
+                nxt = self.__next
+                nxt[rootx], nxt[rooty] = nxt[rooty], nxt[rootx]
+
         except KeyError:
             pass
 
 
     
     def return_sets(self) -> dict[Tdictkey, list]:
+        """
+        Groups all elements by their roots in one pass
+        """
 
         ret: dict = {}
 
@@ -186,7 +199,7 @@ class DisjointSet:
             if rootx not in ret:
                 ret[rootx] = [node]
             else:
-                ret[rootx] = (node)
+                ret[rootx].append(node)
                 
 
         return ret 
@@ -194,13 +207,18 @@ class DisjointSet:
 
 
     def return_members_list(self, x):
+        """
+        Returns members of the set containing x, walks the circular
+        list so it costs O(size of the set)
+        """
 
-        rootx = self.find(x)
-        ret = []
+        nxt = self.__next
+        ret = [x]
 
-        for node in self.__parent:
-            if rootx == self.find(node):
-                ret.append(node)
+        node = nxt[x]
+        while node != x:
+            ret.append(node)
+            node = nxt[node]
 
         return ret
 
@@ -218,14 +236,7 @@ class DisjointSet:
     
     def return_members_set(self, x: Hashable) -> set:
 
-        rootx = self.find(x)
-        ret = set()
-
-        for node in self.__parent:
-            if rootx == self.find(node):
-                ret.add(node)
-
-        return ret
+        return set(self.return_members_list(x))
 
 
 
@@ -244,7 +255,332 @@ class DisjointSet:
         return self.find(x) == self.find(y)
 
 
-    
+
+class ArrayDisjointSet:
+    """
+        Implements union-find data structure for integer elements
+        from range [0, N), kept in compact arrays instead of dicts.
+        Find is iterative (path halving), so long chains do not hit
+        the recursion limit. Union is by size.
+
+        Like in DisjointSet, element takes part in unions only after
+        makeset(), unions with other elements are ignored.
+
+        Every root carries a bitmask of flags (e.g. grid edges touched
+        by the set), flags of merged sets are OR-ed together.
+
+        ...
+        Attributes
+        ----------
+        __parent : array
+            parent of every member, root is its own parent
+        __size : array
+            sizes of sets, valid for roots only
+        __member : bytearray
+            1 for elements added with makeset()
+        __flags : bytearray
+            flags of sets, valid for roots only
+        __next : array
+            next member of the same set, members of every set
+            form a circular list
+        __flagged : set
+            roots of sets with any flag set
+
+        __parent and __next are filled in makeset(), so creating
+        the structure costs only zeroed memory, find() and flags()
+        are valid for members only
+
+        Properties
+        ----------
+        trees
+            returns number of elements in forest
+
+        Methods
+        -------
+        makeset(x)
+            adds element as single node disjoint set
+        find(x)
+            returns element's root (representant)
+        union(x, y)
+            joins two sets in to one
+        union_many(xs, ys)
+            joins sets of every pair (xs[i], ys[i])
+        flag(x, bits)
+            sets flags on the set containing x
+        flags(x)
+            returns flags of the set containing x
+        connected(x, y)
+            checks if x and y are in the same set
+    """
+
+
+    def __init__(self, n: int) -> None:
+        # zerowane bufory, bez budowania obiektów Pythona dla każdego elementu
+        self.__parent: array = array('i', [0]) * n
+        self.__size: array = array('i', [1]) * n
+        self.__member: bytearray = bytearray(n)
+        self.__flags: bytearray = bytearray(n)
+        self.__next: array = array('i', [0]) * n
+        self.__flagged: set[int] = set()
+        self.__trees: int = 0
+
+
+
+    def __str__(self) -> str:
+        return str({x: self.__parent[x] for x in range(len(self.__member)) if self.__member[x]})
+
+
+
+    def __contains__(self, x):
+        return 0 <= x < len(self.__member) and self.__member[x] == 1
+
+
+
+    def __len__(self) -> int:
+        return len(self.__member)
+
+
+
+    @property
+    def trees(self) -> int:
+        """
+        Returns number of elements in 'forest'
+        """
+
+        return self.__trees
+
+
+
+    def exists(self, key):
+        return key in self
+
+
+
+    def makeset(self, x: int) -> None:
+        """
+            Adds element as one element disjoint set
+
+            Parameters
+            ---------
+            x : int
+                element from range [0, N)
+        """
+
+        if not self.__member[x]:
+            self.__member[x] = 1
+            self.__parent[x] = x
+            self.__next[x] = x
+            self.__trees += 1
+
+
+
+    def find(self, x: int) -> int:
+        """
+            Finds root element of a given one, iteratively
+            with path halving
+
+            Parameters
+            ----------
+            x : int
+                element of which root we will be looking for
+
+            Returns
+            -------
+            int
+                root of the set containing x
+        """
+
+        parent = self.__parent
+
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+
+        return x
+
+
+
+    def union(self, x: int, y: int) -> int:
+        """
+            Merge two disjoint sets, smaller set becomes subtree
+            of the bigger one. Elements that were not added with
+            makeset() are ignored.
+
+            Returns
+            -------
+            int
+                root of merged set, -1 if nothing was merged
+        """
+
+        if not (self.__member[x] and self.__member[y]):
+            return -1
+
+        rootx = self.find(x)
+        rooty = self.find(y)
+
+        if rootx == rooty:
+            return rootx
+
+        size = self.__size
+        if size[rootx] < size[rooty]:
+            rootx, rooty = rooty, rootx
+
+        self.__parent[rooty] = rootx
+        size[rootx] += size[rooty]
+        self.__flags[rootx] |= self.__flags[rooty]
+
+        # zbiór z flagami pamiętany tylko pod nowym korzeniem
+        if self.__flags[rootx]:
+            self.__flagged.discard(rooty)
+            self.__flagged.add(rootx)
+
+        nxt = self.__next
+        nxt[rootx], nxt[rooty] = nxt[rooty], nxt[rootx]
+
+        return rootx
+
+
+
+    def union_many(self, xs: Iterable[int], ys: Iterable[int]) -> None:
+        """
+            Merges sets of every pair (xs[i], ys[i]). Accepts lists,
+            arrays or NumPy arrays of the same length.
+        """
+
+        if hasattr(xs, 'tolist'):
+            xs = xs.tolist()
+        if hasattr(ys, 'tolist'):
+            ys = ys.tolist()
+
+        parent = self.__parent
+        size = self.__size
+        member = self.__member
+        flags = self.__flags
+        flagged = self.__flagged
+        nxt = self.__next
+
+        for x, y in zip(xs, ys):
+            if not (member[x] and member[y]):
+                continue
+
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+
+            while parent[y] != y:
+                parent[y] = parent[parent[y]]
+                y = parent[y]
+
+            if x != y:
+                if size[x] < size[y]:
+                    x, y = y, x
+
+                parent[y] = x
+                size[x] += size[y]
+                flags[x] |= flags[y]
+                nxt[x], nxt[y] = nxt[y], nxt[x]
+
+                if flags[x]:
+                    flagged.discard(y)
+                    flagged.add(x)
+
+
+
+    def flag(self, x: int, bits: int) -> int:
+        """
+            Sets flags on the set containing x
+
+            Returns
+            -------
+            int
+                all flags of the set after the change
+        """
+
+        root = self.find(x)
+        self.__flags[root] |= bits
+
+        if self.__flags[root]:
+            self.__flagged.add(root)
+
+        return self.__flags[root]
+
+
+
+    def flags(self, x: int) -> int:
+        """
+        Returns flags of the set containing x
+        """
+
+        return self.__flags[self.find(x)]
+
+
+
+    def connected(self, x: int, y: int) -> bool:
+        """
+        Checks if two elements are connected (are in the same set)
+        """
+
+        return self.find(x) == self.find(y)
+
+
+
+    def return_flagged_list(self, bits: int) -> list[int]:
+        """
+        Returns members of all sets that have any of given flags,
+        only roots of flagged sets are scanned, members are taken
+        from circular lists
+        """
+
+        flags = self.__flags
+        ret = []
+
+        for root in self.__flagged:
+            if flags[root] & bits:
+                ret.extend(self.return_members_list(root))
+
+        return ret
+
+
+
+    def return_sets(self) -> dict[int, list[int]]:
+        """
+        Groups all members by their roots in one pass
+        """
+
+        member = self.__member
+        ret: dict = {}
+
+        for node in range(len(member)):
+            if member[node]:
+                rootx = self.find(node)
+
+                if rootx not in ret:
+                    ret[rootx] = [node]
+                else:
+                    ret[rootx].append(node)
+
+        return ret
+
+
+
+    def return_members_list(self, x: int) -> list[int]:
+        """
+        Returns members of the set containing x, walks the circular
+        list so it costs O(size of the set)
+        """
+
+        nxt = self.__next
+        ret = [x]
+
+        node = nxt[x]
+        while node != x:
+            ret.append(node)
+            node = nxt[node]
+
+        return ret
+
 
 
+    def return_members_set(self, x: int) -> set:
 
+        return set(self.return_members_list(x))